@@ -0,0 +1,104 @@
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+CacheInfo = namedtuple("cache_info", ["hits", "misses", "maxsize", "size"])
+
+
+class LRUCache:
+    """
+    Bounded cache which evicts the least recently used entry when it is full.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        if maxsize < 1:
+            raise ValueError("Cache size must be positive")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get_or_create(self, key, factory):
+        """
+        Get cached value or create it with factory and cache it.
+        :param key: Hashable key of the value
+        :param factory: Function without arguments which creates the value
+        :return: Cached value
+        """
+
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+
+        value = factory()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+        return value
+
+    def get(self, key, default=None):
+        """
+        Get cached value without creating it.
+        :param key: Hashable key of the value
+        :param default: Value returned if the key is not cached
+        :return: Cached value or default
+        """
+
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """
+        Cache value, replacing the previous value of the key.
+        :param key: Hashable key of the value
+        :param value: Value
+        :return: None
+        """
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def resize(self, maxsize: int):
+        """
+        Change eviction limit, extra least recently used entries are evicted immediately.
+        :param maxsize: New maximum number of entries
+        :return: None
+        """
+
+        if maxsize < 1:
+            raise ValueError("Cache size must be positive")
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
@@ -1,4 +1,4 @@
-from pyformlang.cfg import CFG
+from pyformlang.cfg import CFG, Variable
 
 
 def get_cfg_from_file(file: str) -> CFG:
@@ -11,3 +11,12 @@ def cfg_to_weak_normal_form(cfg: CFG) -> CFG:
     prods = new_cfg._get_productions_with_only_single_terminals()
     prods = new_cfg._decompose_productions(prods)
     return CFG(start_symbol=new_cfg.start_symbol, productions=set(prods))
+
+
+def copy_cfg(cfg: CFG, start_symbol: Variable = None) -> CFG:
+    return CFG(
+        variables=set(cfg.variables),
+        terminals=set(cfg.terminals),
+        start_symbol=cfg.start_symbol if start_symbol is None else start_symbol,
+        productions=set(cfg.productions),
+    )
@@ -4,7 +4,9 @@ from collections import defaultdict, deque
 from networkx import MultiGraph
 from pyformlang.cfg import CFG, Variable, Terminal
 
-from project.cfg.cfpq_algo import Algo
+from project.cfg.cfg_util import copy_cfg
+from project.cfg.cfpq_algo import Algo, cf_multi_source
+from project.instrumentation import Stats
 
 
 def cfpq(
@@ -14,9 +16,10 @@ def cfpq(
     final_nodes: set = None,
     start_symbol: Variable = Variable("S"),
     algo=Algo.hellings,
+    stats: Stats = None,
 ):
 
-    cfg._start_symbol = start_symbol
+    cfg = copy_cfg(cfg, start_symbol)
 
     if not start_nodes:
         start_nodes = graph.nodes
@@ -25,8 +28,49 @@ def cfpq(
         final_nodes = graph.nodes
 
     result = set()
-    for i, v, j in algo(cfg, graph):
+    for i, v, j in algo(cfg, graph, stats):
         if v == start_symbol and i in start_nodes and j in final_nodes:
             result.add((i, j))
 
     return result
+
+
+def cfpq_multi_source(
+    graph: MultiGraph,
+    cfg: CFG,
+    start_nodes: set = None,
+    final_nodes: set = None,
+    start_symbol: Variable = Variable("S"),
+    stats: Stats = None,
+):
+    """
+    Context-free path query from given start nodes, only triples reachable from them are derived.
+    Returns the same pairs as cfpq with the same start and final nodes.
+    :param graph: origin graph
+    :param cfg: context-free grammar
+    :param start_nodes: set of start nodes, all nodes if None or empty as for cfpq
+    :param final_nodes: set of final nodes, all nodes if None or empty as for cfpq
+    :param start_symbol: start nonterminal of the query
+    :param stats: Stats collecting phase timers and rounds, None to disable
+    :return: Pairs (start node, final node).
+    """
+
+    cfg = copy_cfg(cfg, start_symbol)
+
+    if not start_nodes:
+        start_nodes = graph.nodes
+
+    node_ids, matrices = cf_multi_source(cfg, graph, start_nodes, stats)
+    if start_symbol not in matrices:
+        return set()
+
+    start_nodes = set(start_nodes)
+    final_nodes = set(final_nodes) if final_nodes else None
+
+    rows, cols = matrices[start_symbol].nonzero()
+    return {
+        (node_ids[i], node_ids[j])
+        for i, j in zip(rows.tolist(), cols.tolist())
+        if node_ids[i] in start_nodes
+        and (final_nodes is None or node_ids[j] in final_nodes)
+    }
@@ -1,113 +1,458 @@
 import enum
 from collections import defaultdict, deque
+from itertools import count, islice
 
+import numpy as np
 from networkx import MultiGraph
 from pyformlang.cfg import Terminal, CFG
-from scipy.sparse import csr_matrix
+from scipy import sparse
+from scipy.sparse import coo_matrix, csr_matrix
 
-from project.cfg.cfg_util import cfg_to_weak_normal_form
+from project.cfg.compiled_grammar import compile_grammar
+from project.cfg.rsm import RSM
+from project.instrumentation import Stats, phase, record_iteration
+from project.re.boolean_decomposition import (
+    BooleanDecomposition,
+    build_boolean_matrix,
+    extend_closure,
+)
 
 
-def _hellings(cfg: CFG, graph: MultiGraph):
-    weak_nfh = cfg_to_weak_normal_form(cfg)
-    # N -> eps
-    eps_non_terms = set()
-    # A -> a
-    term_prods = defaultdict(set)
-    # C -> AB
-    non_term_prods = defaultdict(set)
+def _hellings(cfg: CFG, graph: MultiGraph, stats: Stats = None):
+    """
+    Hellings algorithm with worklist. Triples (i, N, j) are indexed by start and by end vertex
+    and productions C -> A B by body, so every popped triple is joined only with adjacent triples.
+    """
 
-    for prod in weak_nfh.productions:
-        if len(prod.body) == 0:
-            eps_non_terms.add(prod.head)
-        elif len(prod.body) == 1:
-            term_prods[prod.head].add(prod.body[0])
-        else:
-            non_term_prods[prod.head].add((prod.body[0], prod.body[1]))
-
-    first_set = {(i, v, i) for v in eps_non_terms for i in graph.nodes}
-    second_set = {
-        (i, v, j)
-        for v, terms in term_prods.items()
-        for i, j, label in graph.edges(data="label")
-        if Terminal(label) in terms
-    }
+    with phase(stats, "normal_form"):
+        tables = compile_grammar(cfg).weak_tables
+
+    r = set()
+    # i -> N -> {j} for (i, N, j) in r
+    by_start = defaultdict(lambda: defaultdict(set))
+    # j -> N -> {i} for (i, N, j) in r
+    by_end = defaultdict(lambda: defaultdict(set))
+    m = deque()
 
-    r = first_set.union(second_set)
-    m = deque(r.copy())
+    def add(i, v, j):
+        if (i, v, j) not in r:
+            r.add((i, v, j))
+            by_start[i][v].add(j)
+            by_end[j][v].add(i)
+            m.append((i, v, j))
 
-    while m:
-        i, v, j = m.popleft()
-        temp = set()
-        for l, v2, k in r:
-            if i == k:
-                for head, body in non_term_prods.items():
-                    if (v2, v) in body and (l, head, j) not in r:
-                        m.append((l, head, j))
-                        temp.add((l, head, j))
+    for v in tables.eps:
+        for i in graph.nodes:
+            add(i, v, i)
+    for i, j, label in graph.edges(data="label"):
+        for v in tables.terminal.get(Terminal(label), ()):
+            add(i, v, j)
 
-            if j == l:
-                for head, body in non_term_prods.items():
-                    if (v, v2) in body and (i, head, k) not in r:
-                        m.append((i, head, k))
-                        temp.add((i, head, k))
+    with phase(stats, "closure"):
+        while m:
+            i, v, j = m.popleft()
+            record_iteration(stats, "hellings")
 
-        r = r.union(temp)
+            for head, v2, is_first in tables.uses.get(v, ()):
+                if is_first:
+                    # (i, v, j), (j, v2, k) -> (i, head, k)
+                    for k in list(by_start[j][v2]):
+                        add(i, head, k)
+                else:
+                    # (l, v2, i), (i, v, j) -> (l, head, j)
+                    for l in list(by_end[i][v2]):
+                        add(l, head, j)
 
     return r
 
 
-def _cf_closure(cfg: CFG, graph: MultiGraph):
-    cfg = cfg_to_weak_normal_form(cfg)
+def _cf_closure(cfg: CFG, graph: MultiGraph, stats: Stats = None):
+    node_ids, tables, matrices = _cf_initial_matrices(cfg, graph, stats)
+
+    with phase(stats, "closure"):
+        while True:
+            changed = False
+            for nonterm, non_terms in tables.binary.items():
+                old_nnz = matrices[nonterm].nnz
+                matrices[nonterm] += sum(
+                    matrices[n1] @ matrices[n2] for n1, n2 in non_terms
+                )
+                changed |= old_nnz != matrices[nonterm].nnz
+            record_iteration(stats, "matrix_prod", *matrices.values())
+
+            if not changed:
+                break
+
+    return _cf_triples(matrices, node_ids)
+
+
+def _cf_closure_semi_naive(cfg: CFG, graph: MultiGraph, stats: Stats = None):
+    """
+    Matrix algorithm with per-nonterminal delta matrices of pairs not yet joined with other matrices.
+    Every round takes delta of one nonterminal X and computes only dX @ M[B] for C -> X B
+    and M[A] @ dX for C -> A X, new pairs of C are added to its delta.
+    """
+
+    node_ids, tables, matrices = _cf_initial_matrices(cfg, graph, stats)
+
+    delta = {nonterm: matrix for nonterm, matrix in matrices.items() if matrix.nnz}
+    queue = deque(delta)
 
-    n = graph.number_of_nodes()
-    edges = graph.edges(data="label")
+    with phase(stats, "closure"):
+        while queue:
+            nonterm = queue.popleft()
+            changes = delta.pop(nonterm)
 
-    eps_terms = set()
-    term_prods = defaultdict(set)
-    non_term_prods = defaultdict(set)
+            for head, other, is_first in tables.uses.get(nonterm, ()):
+                derived = (
+                    changes @ matrices[other] if is_first else matrices[other] @ changes
+                )
+                new = csr_matrix(derived > matrices[head])
+                if new.nnz == 0:
+                    continue
+
+                matrices[head] = matrices[head] + new
+                if head in delta:
+                    delta[head] = delta[head] + new
+                else:
+                    delta[head] = new
+                    queue.append(head)
+
+            record_iteration(stats, "matrix_prod_semi_naive", *matrices.values())
+
+    return _cf_triples(matrices, node_ids)
+
+
+def _cf_initial_matrices(cfg: CFG, graph: MultiGraph, stats: Stats = None):
+    """
+    Build matrices of pairs derived by eps and terminal productions of weak normal form.
+    :return: Node for every index, ProductionTables of weak normal form, dict nonterminal -> boolean matrix
+    """
+
+    with phase(stats, "normal_form"):
+        grammar = compile_grammar(cfg)
+        tables = grammar.weak_tables
+
+    node_ids = list(graph.nodes)
+    n = len(node_ids)
+
+    matrices = {
+        non_term: csr_matrix((n, n), dtype=bool)
+        for non_term in grammar.weak_normal_form.variables
+    }
+    matrices.update(_terminal_matrices(graph, node_ids, tables.terminal))
+    for t in tables.eps:
+        matrices[t] = matrices[t] + sparse.identity(n, dtype=bool, format="csr")
 
-    for p in cfg.productions:
-        head, body = p.head, p.body
-        body_len = len(body)
-        if body_len == 0:
-            eps_terms.add(head)
-        elif body_len == 1:
-            term_prods[head].add(body[0])
-        elif body_len == 2:
-            non_term_prods[head].add((body[0], body[1]))
+    return node_ids, tables, matrices
 
-    matrices = {non_term: csr_matrix((n, n), dtype=bool) for non_term in cfg.variables}
 
-    for i in range(n):
-        for t in eps_terms:
-            matrices[t][i, i] = True
+def _terminal_matrices(graph: MultiGraph, node_ids: list, term_prods: dict) -> dict:
+    """
+    Build matrices of graph edges derived by terminal productions A -> a.
+    :return: Dict head -> boolean matrix, heads without edges are omitted
+    """
 
-    for i, j, lab in edges:
-        for N, t in term_prods.items():
-            if Terminal(lab) in t:
-                matrices[N][i, j] = True
+    node_indices = {node: index for index, node in enumerate(node_ids)}
+    n = len(node_ids)
 
-    while True:
-        changed = False
-        for nonterm, non_terms in non_term_prods.items():
-            old_nnz = matrices[nonterm].nnz
-            matrices[nonterm] += sum(
-                matrices[n1] @ matrices[n2] for n1, n2 in non_terms
+    pairs = defaultdict(lambda: ([], []))
+    for i, j, lab in graph.edges(data="label"):
+        for head in term_prods.get(Terminal(lab), ()):
+            pairs[head][0].append(node_indices[i])
+            pairs[head][1].append(node_indices[j])
+
+    return {
+        head: coo_matrix(
+            (np.ones(len(rows), dtype=bool), (rows, cols)), shape=(n, n)
+        ).tocsr()
+        for head, (rows, cols) in pairs.items()
+    }
+
+
+def cf_multi_source(cfg: CFG, graph: MultiGraph, start_nodes: set, stats: Stats = None):
+    """
+    Semi-naive matrix algorithm deriving only triples (i, N, j) which start in source vertices.
+    Sources are the start nodes and the ends of triples of every A used as C -> A B,
+    since only triples of B from there can be joined with them.
+    Only explored vertices get indices, in order of discovery, and terminal rows of a source are built
+    from its own edges when it becomes a source, so work is proportional to the part of graph
+    explored from start nodes and not to the size of the graph.
+    Matrices have spare rows and columns, their capacity is doubled when they are full.
+    Edges of undirected graph are oriented by positions of their ends in graph.nodes, which are found
+    by scanning graph.nodes only as far as the explored vertices, so it is O(|V|) in the worst case.
+    :return: Node for every index and dict nonterminal -> boolean matrix
+    """
+
+    with phase(stats, "normal_form"):
+        grammar = compile_grammar(cfg)
+        tables = grammar.weak_tables
+
+    # Edges of undirected graph are taken in the orientation of graph.edges, from the earlier node
+    nodes_in_order = None if graph.is_directed() else iter(graph.nodes)
+    positions = dict()
+
+    # Label -> heads of terminal productions
+    label_heads = dict()
+    node_ids = []
+    node_indices = dict()
+    capacity = max(len(start_nodes), 1) * 2
+    is_source = np.zeros(capacity, dtype=bool)
+    matrices = {
+        non_term: csr_matrix((capacity, capacity), dtype=bool)
+        for non_term in grammar.weak_normal_form.variables
+    }
+    delta = dict()
+    queue = deque()
+
+    def index_of(node) -> int:
+        if node not in node_indices:
+            node_indices[node] = len(node_ids)
+            node_ids.append(node)
+        return node_indices[node]
+
+    def position(node) -> int:
+        # Scanned part of graph.nodes is doubled, so scanning is linear in the reached position
+        while node not in positions:
+            scanned = len(positions)
+            positions.update(
+                zip(islice(nodes_in_order, max(scanned, 1024)), count(scanned))
             )
-            changed |= old_nnz != matrices[nonterm].nnz
+        return positions[node]
+
+    def grow():
+        nonlocal capacity, is_source
+        if len(node_ids) <= capacity:
+            return
+        capacity = max(capacity * 2, len(node_ids))
+        is_source = np.concatenate(
+            [is_source, np.zeros(capacity - len(is_source), dtype=bool)]
+        )
+        for matrix in [*matrices.values(), *delta.values()]:
+            matrix.resize((capacity, capacity))
+
+    def add(non_term, new):
+        matrices[non_term] = matrices[non_term] + new
+        if non_term in delta:
+            delta[non_term] = delta[non_term] + new
+        else:
+            delta[non_term] = new
+            queue.append(non_term)
+
+    def add_sources(sources: list):
+        pairs = defaultdict(lambda: ([], []))
+        for non_term in tables.eps:
+            pairs[non_term][0].extend(sources)
+            pairs[non_term][1].extend(sources)
+
+        batch = {node_ids[i]: i for i in sources}
+        # Undirected edge between two sources is returned once, from either end
+        for u, v, label in graph.edges(list(batch), data="label"):
+            if nodes_in_order is not None and position(v) < position(u):
+                u, v = v, u
+                if u not in batch:
+                    continue
+            if label not in label_heads:
+                label_heads[label] = tables.terminal.get(Terminal(label), ())
+            for non_term in label_heads[label]:
+                pairs[non_term][0].append(batch[u])
+                pairs[non_term][1].append(index_of(v))
+
+        grow()
+        is_source[sources] = True
+        for non_term, (rows, cols) in pairs.items():
+            add(non_term, build_boolean_matrix(rows, cols, capacity))
+
+    add_sources([index_of(node) for node in start_nodes if node in graph])
+
+    with phase(stats, "closure"):
+        while queue:
+            non_term = queue.popleft()
+            changes = delta.pop(non_term)
+            uses = tables.uses.get(non_term, ())
 
-        if not changed:
-            break
+            if any(is_first for _, _, is_first in uses):
+                ends = np.unique(changes.indices)
+                ends = ends[~is_source[ends]]
+                if len(ends) > 0:
+                    add_sources(ends.tolist())
+                    changes.resize((capacity, capacity))
 
+            for head, other, is_first in uses:
+                derived = (
+                    changes @ matrices[other] if is_first else matrices[other] @ changes
+                )
+                new = csr_matrix(derived > matrices[head])
+                if new.nnz > 0:
+                    add(head, new)
+
+            record_iteration(stats, "multi_source", *matrices.values())
+
+    return node_ids, matrices
+
+
+def _cf_triples(matrices: dict, node_ids: list) -> set:
     return set(
-        (i, non_term, j)
+        (node_ids[i], non_term, node_ids[j])
         for non_term, mtx in matrices.items()
         for i, j in zip(*mtx.nonzero())
     )
 
 
+def _tensor(cfg: CFG, graph: MultiGraph, stats: Stats = None):
+    """
+    Tensor algorithm: grammar is turned to RSM without normal form conversion,
+    graph is intersected with RSM by kronecker product, and for every path from start to final state of box A
+    the edge labeled A is added to the graph. Closure of intersection is extended
+    only by product edges of added nonterminal edges until nothing is added.
+    Terminal and nonterminal edges are keyed by _terminal_key and _nonterminal_key,
+    so a graph label equal to a variable name is not taken for a derived nonterminal.
+    """
+
+    with phase(stats, "rsm"):
+        grammar = compile_grammar(cfg)
+        rsm_bd, box_of_state, variables = _rsm_decomposition(
+            grammar.rsm, {var.value for var in grammar.cfg.variables}
+        )
+
+    # Edges are taken in the same direction as by other algorithms, also for undirected graph
+    node_ids = list(graph.nodes)
+    node_indices = {node: index for index, node in enumerate(node_ids)}
+    n = len(node_ids)
+    edges = defaultdict(lambda: ([], []))
+    for u, v, label in graph.edges(data="label"):
+        rows, cols = edges[_terminal_key(label)]
+        rows.append(node_indices[u])
+        cols.append(node_indices[v])
+    graph_bd = BooleanDecomposition.from_edges(n, dict(edges))
+    rsm_bd.stats = stats
+    empty = BooleanDecomposition.matrix_converter(csr_matrix((n, n), dtype=bool))
+
+    found = {_nonterminal_key(var.value): empty for var in variables}
+    # Nullable nonterminals derive every vertex to itself
+    for box, var in enumerate(variables):
+        box_states = box_of_state == box
+        if (rsm_bd.start_mask & rsm_bd.final_mask & box_states).any():
+            found[_nonterminal_key(var.value)] = BooleanDecomposition.matrix_converter(
+                sparse.identity(n, dtype=bool, format="csr")
+            )
+
+    for symbol, matrix in found.items():
+        graph_bd.boolean_matrices[symbol] = (
+            graph_bd.boolean_matrices.get(symbol, empty) + matrix
+        )
+
+    intersection = rsm_bd.intersection(graph_bd)
+    closure = intersection.transitive_closure(semi_naive=True)
+
+    with phase(stats, "closure"):
+        while True:
+            new_edges = _box_paths(closure, rsm_bd, box_of_state, variables, n)
+
+            delta = None
+            for symbol, matrix in new_edges.items():
+                new = BooleanDecomposition.matrix_converter(matrix > found[symbol])
+                if new.nnz == 0:
+                    continue
+                found[symbol] = found[symbol] + new
+                if symbol in rsm_bd.boolean_matrices:
+                    product = BooleanDecomposition.matrix_converter(
+                        sparse.kron(rsm_bd.boolean_matrices[symbol], new)
+                    )
+                    delta = product if delta is None else delta + product
+            record_iteration(stats, "tensor", *found.values())
+
+            if delta is None:
+                break
+            delta = BooleanDecomposition.matrix_converter(delta > closure)
+            closure = extend_closure(closure + delta, delta, stats)
+
+    return {
+        (node_ids[i], var, node_ids[j])
+        for var in variables
+        for i, j in zip(*found[_nonterminal_key(var.value)].nonzero())
+    }
+
+
+def _terminal_key(value):
+    return "terminal", value
+
+
+def _nonterminal_key(value):
+    return "nonterminal", value
+
+
+def _rsm_decomposition(rsm: RSM, variable_names: set):
+    """
+    Build one BooleanDecomposition of all boxes of RSM.
+    Box transitions are keyed by _nonterminal_key if their symbol is a variable name, by _terminal_key otherwise.
+    :param rsm: RSM of the grammar
+    :param variable_names: Names of variables of the grammar
+    :return: BooleanDecomposition, index of box of every state and variable of every box
+    """
+
+    variables = list(rsm.boxes)
+    box_of_state = []
+    indices = dict()
+    start_states, final_states = [], []
+    edges = defaultdict(lambda: ([], []))
+
+    def index_of(box, state):
+        if (box, state) not in indices:
+            indices[(box, state)] = len(box_of_state)
+            box_of_state.append(box)
+        return indices[(box, state)]
+
+    for box, var in enumerate(variables):
+        nfa = rsm.boxes[var]
+        for state in nfa.states:
+            index_of(box, state)
+        start_states.extend(index_of(box, state) for state in nfa.start_states)
+        final_states.extend(index_of(box, state) for state in nfa.final_states)
+        for u, symbol, v in nfa:
+            key = (
+                _nonterminal_key(symbol.value)
+                if symbol.value in variable_names
+                else _terminal_key(symbol.value)
+            )
+            rows, cols = edges[key]
+            rows.append(index_of(box, u))
+            cols.append(index_of(box, v))
+
+    decomposition = BooleanDecomposition.from_edges(
+        len(box_of_state), dict(edges), start_states, final_states
+    )
+
+    return decomposition, np.array(box_of_state, dtype=np.int64), variables
+
+
+def _box_paths(closure, rsm_bd, box_of_state, variables: list, n: int) -> dict:
+    """
+    Select pairs of vertices connected in the intersection by path from start to final state of one box.
+    :return: Dict symbol of box variable -> matrix of pairs of vertices
+    """
+
+    closure = closure.tocoo()
+    rows, cols = closure.row // n, closure.col // n
+    accepted = (
+        rsm_bd.start_mask[rows]
+        & rsm_bd.final_mask[cols]
+        & (box_of_state[rows] == box_of_state[cols])
+    )
+    boxes = box_of_state[rows[accepted]]
+    src, dst = closure.row[accepted] % n, closure.col[accepted] % n
+
+    return {
+        _nonterminal_key(var.value): build_boolean_matrix(
+            src[boxes == box], dst[boxes == box], n
+        )
+        for box, var in enumerate(variables)
+    }
+
+
 class Algo(enum.Enum):
 
     hellings = _hellings
     matrix_prod = _cf_closure
+    matrix_prod_semi_naive = _cf_closure_semi_naive
+    tensor = _tensor
@@ -0,0 +1,116 @@
+from collections import defaultdict, namedtuple
+from functools import cached_property
+
+from pyformlang.cfg import CFG, Variable
+
+from project.cache import LRUCache
+from project.cfg.cfg_util import cfg_to_weak_normal_form, copy_cfg
+from project.cfg.ecfg import ECFG
+from project.cfg.rsm import RSM
+
+ProductionTables = namedtuple(
+    "production_tables", ["eps", "terminal", "binary", "by_body", "uses"]
+)
+
+grammar_cache = LRUCache(maxsize=64)
+
+
+class CompiledGrammar:
+    """
+    Grammar with normal forms, production tables and RSM computed on first use and kept for later queries.
+    Compiled grammars are shared between callers through compile_grammar and must not be modified.
+    Forms are computed from a copy of the grammar, so later changes of the original grammar do not affect them.
+    """
+
+    def __init__(self, cfg: CFG):
+        self.cfg = copy_cfg(cfg)
+        self.start_symbol = self.cfg.start_symbol
+
+    @cached_property
+    def weak_normal_form(self) -> CFG:
+        return cfg_to_weak_normal_form(self.cfg)
+
+    @cached_property
+    def normal_form(self) -> CFG:
+        return self.cfg.to_normal_form()
+
+    @cached_property
+    def weak_tables(self) -> ProductionTables:
+        return _production_tables(self.weak_normal_form)
+
+    @cached_property
+    def normal_tables(self) -> ProductionTables:
+        return _production_tables(self.normal_form)
+
+    @cached_property
+    def generates_epsilon(self) -> bool:
+        return self.cfg.generate_epsilon()
+
+    @cached_property
+    def rsm(self) -> RSM:
+        return RSM.rsm_from_ecfg(ECFG.ecfg_from_cfg(self.cfg)).minimize()
+
+
+def grammar_key(cfg: CFG):
+    """
+    Build hashable key of grammar content: start symbol and productions,
+    where terminals and variables with the same name are distinguished.
+    :param cfg: Grammar
+    :return: Key
+    """
+
+    return (
+        cfg.start_symbol.value if cfg.start_symbol is not None else None,
+        frozenset(
+            (
+                production.head.value,
+                tuple(
+                    (isinstance(symbol, Variable), symbol.value)
+                    for symbol in production.body
+                ),
+            )
+            for production in cfg.productions
+        ),
+    )
+
+
+def compile_grammar(cfg: CFG, cache: LRUCache = grammar_cache) -> CompiledGrammar:
+    """
+    Get compiled grammar, reusing it if a grammar with the same content is cached.
+    :param cfg: Grammar
+    :param cache: Cache of compiled grammars
+    :return: CompiledGrammar
+    """
+
+    return cache.get_or_create(grammar_key(cfg), lambda: CompiledGrammar(cfg))
+
+
+def _production_tables(cfg: CFG) -> ProductionTables:
+    """
+    Split productions of grammar in (weak) normal form by body.
+    :return: ProductionTables with set of heads of eps productions, dict terminal -> heads,
+    dict head -> set of bodies (A, B), dict (A, B) -> heads and dict X -> list of
+    (head, other body symbol, True if X is the first symbol) for every binary production using X
+    """
+
+    eps = set()
+    terminal = defaultdict(set)
+    binary = defaultdict(set)
+    by_body = defaultdict(set)
+    uses = defaultdict(list)
+
+    for p in cfg.productions:
+        head, body = p.head, p.body
+        if len(body) == 0:
+            eps.add(head)
+        elif len(body) == 1:
+            terminal[body[0]].add(head)
+        elif len(body) == 2:
+            binary[head].add((body[0], body[1]))
+            by_body[(body[0], body[1])].add(head)
+            uses[body[0]].append((head, body[1], True))
+            uses[body[1]].append((head, body[0], False))
+
+    return ProductionTables(
+        frozenset(eps), dict(terminal), dict(binary), dict(by_body), dict(uses)
+    )
@@ -1,29 +1,24 @@
-from pyformlang.cfg import CFG
+from pyformlang.cfg import CFG, Terminal
 
+from project.cfg.compiled_grammar import compile_grammar
 
-def cyk(cfg: CFG, query: str):
 
-    if not query:
-        return cfg.generate_epsilon()
+def cyk(cfg: CFG, query: str):
 
-    nfh = cfg.to_normal_form()
+    grammar = compile_grammar(cfg)
 
-    prods_terminal = set()  # Productions like: A -> a, B -> b
-    prods_non_terminals = set()  # Productions like: S -> AB, C -> VM
+    if not query:
+        return grammar.generates_epsilon
 
-    for p in nfh.productions:
-        if (len(p.body)) == 1:
-            prods_terminal.add(p)
-        else:
-            prods_non_terminals.add(p)
+    nfh = grammar.normal_form
+    tables = grammar.normal_tables  # A -> a indexed by terminal, S -> AB by head
 
     n = len(query)
     M = {v: [[False for _ in range(n)] for _ in range(n)] for v in nfh.variables}
 
     for i, s in enumerate(query):
-        prods = [p for p in prods_terminal if p.body[0].value == s]
-        for p in prods:
-            M[p.head][i][i] = True
+        for head in tables.terminal.get(Terminal(s), ()):
+            M[head][i][i] = True
 
     for m in range(1, n):
         for i in range(n - m):
@@ -31,9 +26,10 @@ def cyk(cfg: CFG, query: str):
 
             for k in range(i, j):
 
-                for p in prods_non_terminals:
-                    M[p.head][i][j] = M[p.head][i][j] or (
-                        M[p.body[0]][i][k] and M[p.body[1]][k + 1][j]
-                    )
+                for head, bodies in tables.binary.items():
+                    for first, second in bodies:
+                        M[head][i][j] = M[head][i][j] or (
+                            M[first][i][k] and M[second][k + 1][j]
+                        )
 
     return M[nfh.start_symbol][0][n - 1]
@@ -0,0 +1,106 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+_DISABLED = nullcontext()
+
+
+class Stats:
+    """
+    Collector of per-phase timers, iteration counts, number of nonzero elements of matrices
+    on every iteration and peak memory of recorded sparse matrices.
+    Every event is also passed to the callback if it is given.
+    Algorithms accept stats=None and skip all instrumentation then.
+    """
+
+    def __init__(self, callback=None):
+        """
+        :param callback: Function called as callback(event, name, value) on every event,
+                where event is "phase" with elapsed seconds as value or "iteration" with nnz as value
+        """
+
+        self.callback = callback
+        self.timers = defaultdict(float)
+        self.iterations = defaultdict(int)
+        self.nnz = defaultdict(list)
+        self.peak_memory = 0
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Measure wall time of the block, time of repeated phases is summed up.
+        :param name: Name of the phase
+        """
+
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - begin
+            self.timers[name] += elapsed
+            if self.callback is not None:
+                self.callback("phase", name, elapsed)
+
+    def iteration(self, name: str, *matrices):
+        """
+        Count iteration of a loop and record total nnz and memory of matrices it produced.
+        :param name: Name of the loop
+        :param matrices: Sparse matrices held after the iteration, nnz is not recorded if there are none
+        :return: None
+        """
+
+        nnz = sum(matrix.nnz for matrix in matrices)
+        self.iterations[name] += 1
+        if matrices:
+            self.nnz[name].append(nnz)
+            self.peak_memory = max(
+                self.peak_memory, sum(_matrix_bytes(matrix) for matrix in matrices)
+            )
+        if self.callback is not None:
+            self.callback("iteration", name, nnz)
+
+    def report(self) -> dict:
+        """
+        Get collected values as plain dict.
+        :return: Dict with timers, iterations, nnz and peak_memory
+        """
+
+        return {
+            "timers": dict(self.timers),
+            "iterations": dict(self.iterations),
+            "nnz": {name: list(values) for name, values in self.nnz.items()},
+            "peak_memory": self.peak_memory,
+        }
+
+
+def phase(stats: Stats, name: str):
+    """
+    Context manager measuring the phase if stats is given, doing nothing otherwise.
+    :param stats: Stats or None
+    :param name: Name of the phase
+    """
+
+    if stats is None:
+        return _DISABLED
+    return stats.phase(name)
+
+
+def record_iteration(stats: Stats, name: str, *matrices):
+    """
+    Record iteration if stats is given.
+    :param stats: Stats or None
+    :param name: Name of the loop
+    :param matrices: Sparse matrices held after the iteration
+    :return: None
+    """
+
+    if stats is not None:
+        stats.iteration(name, *matrices)
+
+
+def _matrix_bytes(matrix) -> int:
+    return sum(
+        getattr(matrix, attribute).nbytes
+        for attribute in ("data", "indices", "indptr", "row", "col")
+        if hasattr(matrix, attribute)
+    )
@@ -1,16 +1,24 @@
+from functools import cached_property
+
 from pyformlang.finite_automaton import (
     NondeterministicFiniteAutomaton,
     EpsilonNFA,
     State,
 )
 
+import numpy as np
 from scipy import sparse
-from scipy.sparse import lil_matrix, lil_array, csr_matrix, vstack
+from scipy.sparse import csr_matrix
+
+from project.instrumentation import Stats, phase, record_iteration
+from project.re.parallel import Parallelism, parallel_map, shared_matrices
 
 
 class BooleanDecomposition:
     """
     This class is representation of graph as set of boolean matrices.
+    Start and final states are kept both as sets of states and as boolean masks over state indices,
+    whichever is missing is derived from the other on first access.
     """
 
     def __init__(self, automata: EpsilonNFA = None):
@@ -24,15 +32,125 @@ class BooleanDecomposition:
             }
             self.boolean_matrices = self._get_boolean_matrices(automata)
         else:
-            self.states = set()
-            self.start_states = set()
-            self.final_states = set()
             self.num_of_states = 0
-            self.indexed_states = dict()
+            self.start_mask = np.zeros(0, dtype=bool)
+            self.final_mask = np.zeros(0, dtype=bool)
             self.boolean_matrices = dict()
 
     matrix_converter = lambda mat: mat.tocsr()
 
+    # Parallelism used for per-symbol products, None to compute them sequentially
+    parallelism = None
+
+    # Stats collecting phase timers and iterations, None to disable instrumentation
+    stats = None
+
+    @cached_property
+    def states(self) -> set:
+        return set(range(self.num_of_states))
+
+    @cached_property
+    def indexed_states(self) -> dict:
+        return {state: state for state in range(self.num_of_states)}
+
+    @cached_property
+    def start_states(self) -> set:
+        return set(np.flatnonzero(self.start_mask).tolist())
+
+    @cached_property
+    def final_states(self) -> set:
+        return set(np.flatnonzero(self.final_mask).tolist())
+
+    @cached_property
+    def start_mask(self) -> np.ndarray:
+        return self._states_to_mask(self.start_states)
+
+    @cached_property
+    def final_mask(self) -> np.ndarray:
+        return self._states_to_mask(self.final_states)
+
+    @cached_property
+    def node_ids(self) -> list:
+        """
+        Original node (state value) for every state index.
+        """
+
+        node_ids = [None] * self.num_of_states
+        for state, index in self.indexed_states.items():
+            node_ids[index] = state.value if isinstance(state, State) else state
+        return node_ids
+
+    @cached_property
+    def node_indices(self) -> dict:
+        return {node: index for index, node in enumerate(self.node_ids)}
+
+    def nodes_to_mask(self, nodes) -> np.ndarray:
+        """
+        Convert original nodes to boolean mask over state indices, unknown nodes are skipped.
+        :param nodes: Nodes or states, None for all nodes
+        :return: Boolean mask
+        """
+
+        if nodes is None:
+            return np.ones(self.num_of_states, dtype=bool)
+        return nodes_to_mask(nodes, self.node_indices, self.num_of_states)
+
+    def with_nodes(
+        self, start_nodes: set = None, final_nodes: set = None
+    ) -> "BooleanDecomposition":
+        """
+        Get decomposition sharing boolean matrices with this one, but with other start and final nodes.
+        :param start_nodes: Nodes to be start, all nodes if None
+        :param final_nodes: Nodes to be final, all nodes if None
+        :return: BooleanDecomposition
+        """
+
+        result = BooleanDecomposition()
+        result.num_of_states = self.num_of_states
+        result.boolean_matrices = self.boolean_matrices
+        result.node_ids = self.node_ids
+        result.node_indices = self.node_indices
+        result.start_mask = self.nodes_to_mask(start_nodes)
+        result.final_mask = self.nodes_to_mask(final_nodes)
+
+        return result
+
+    def _states_to_mask(self, states) -> np.ndarray:
+        mask = np.zeros(self.num_of_states, dtype=bool)
+        for state in states:
+            index = self.indexed_states.get(state)
+            if index is not None:
+                mask[index] = True
+        return mask
+
+    @classmethod
+    def from_edges(
+        cls,
+        num_of_states: int,
+        edges: dict,
+        start_states=None,
+        final_states=None,
+    ) -> "BooleanDecomposition":
+        """
+        Build BooleanDecomposition from index arrays, every matrix is built once from COO data.
+        :param num_of_states: Number of states, states are the indices 0..num_of_states - 1
+        :param edges: Dict of symbol -> pair (rows, cols) of source and destination indices
+        :param start_states: Indices or boolean mask of start states
+        :param final_states: Indices or boolean mask of final states
+        :return: BooleanDecomposition
+        """
+
+        result = cls()
+        result.num_of_states = num_of_states
+        result.start_mask = _to_mask(start_states, num_of_states)
+        result.final_mask = _to_mask(final_states, num_of_states)
+        result.boolean_matrices = {
+            symbol: build_boolean_matrix(rows, cols, num_of_states)
+            for symbol, (rows, cols) in edges.items()
+        }
+
+        return result
+
     def _get_boolean_matrices(self, automata) -> dict:
         """
         Service function for building boolean matrices.
@@ -40,24 +158,22 @@ class BooleanDecomposition:
         :return: Dict of boolean matrices
         """
 
-        matrices = dict()
+        edges = dict()
 
         for from_state, transitions in automata.to_dict().items():
+            from_index = self.indexed_states[from_state]
             for symbol, to_states in transitions.items():
                 if not isinstance(to_states, set):
                     to_states = {to_states}
+                rows, cols = edges.setdefault(symbol, ([], []))
                 for to_state in to_states:
-                    from_index = self.indexed_states[from_state]
-                    to_index = self.indexed_states[to_state]
-                    if symbol not in matrices:
-                        matrices[symbol] = BooleanDecomposition.matrix_converter(
-                            sparse.csr_matrix(
-                                (self.num_of_states, self.num_of_states), dtype=bool
-                            )
-                        )
-                    matrices[symbol][from_index, to_index] = True
-
-        return matrices
+                    rows.append(from_index)
+                    cols.append(self.indexed_states[to_state])
+
+        return {
+            symbol: build_boolean_matrix(rows, cols, self.num_of_states)
+            for symbol, (rows, cols) in edges.items()
+        }
 
     def to_nfa(self) -> NondeterministicFiniteAutomaton:
         """
@@ -86,101 +202,214 @@ class BooleanDecomposition:
         """
 
         result = BooleanDecomposition()
+        result.stats = self.stats
 
-        symbols = self.boolean_matrices.keys() & other.boolean_matrices.keys()
+        symbols = list(self.boolean_matrices.keys() & other.boolean_matrices.keys())
 
-        for symbol in symbols:
-            result.boolean_matrices[symbol] = BooleanDecomposition.matrix_converter(
-                sparse.kron(
-                    self.boolean_matrices[symbol], other.boolean_matrices[symbol]
-                )
+        with phase(self.stats, "kronecker"):
+            products = parallel_map(
+                self.parallelism,
+                _kron,
+                [
+                    (self.boolean_matrices[symbol], other.boolean_matrices[symbol])
+                    for symbol in symbols
+                ],
             )
+        result.boolean_matrices = dict(zip(symbols, products))
 
         result.num_of_states = self.num_of_states * other.num_of_states
+        result.start_mask = np.outer(self.start_mask, other.start_mask).ravel()
+        result.final_mask = np.outer(self.final_mask, other.final_mask).ravel()
 
-        for left_state, left_index in self.indexed_states.items():
-            for right_state, right_index in other.indexed_states.items():
-                state = left_index * other.num_of_states + right_index
-                result.indexed_states[state] = state
+        return result
+
+    def product_reachability(self, other: "BooleanDecomposition"):
+        """
+        Find pairs of states reachable in intersection with other automaton without building kronecker product.
+        Product is traversed by blocks: for every state q of other there is a matrix of pairs (u, v) of own states,
+        such that (v, q) is reachable from (u, p) where u, p are start states, and transition p -a-> q of other
+        moves a block along own matrix of symbol a.
+        :param other: Right operand of intersection, usually small automaton of regular expression
+        :return: Matrix of pairs (start state, final state) connected by non-empty path accepted by other
+        """
 
-                if (
-                    left_state in self.start_states
-                    and right_state in other.start_states
-                ):
-                    result.start_states.add(state)
+        n = self.num_of_states
+        k = other.num_of_states
 
-                if (
-                    left_state in self.final_states
-                    and right_state in other.final_states
-                ):
-                    result.final_states.add(state)
+        transitions = [[] for _ in range(k)]
+        for symbol in self.boolean_matrices.keys() & other.boolean_matrices.keys():
+            graph_matrix = self.boolean_matrices[symbol]
+            for p, q in zip(*other.boolean_matrices[symbol].nonzero()):
+                transitions[p].append((graph_matrix, q))
 
-        return result
+        empty = BooleanDecomposition.matrix_converter(csr_matrix((n, n), dtype=bool))
+        starts = BooleanDecomposition.matrix_converter(
+            sparse.diags(self.start_mask, dtype=bool)
+        )
+
+        reached = [empty] * k
+        front = [starts if is_start else empty for is_start in other.start_mask]
+
+        while any(block.nnz > 0 for block in front):
+            new = [empty] * k
+            for p, block in enumerate(front):
+                if block.nnz == 0:
+                    continue
+                for graph_matrix, q in transitions[p]:
+                    new[q] = new[q] + block @ graph_matrix
 
-    def transitive_closure(self):
+            for q in range(k):
+                new[q] = BooleanDecomposition.matrix_converter(new[q] > reached[q])
+                reached[q] = reached[q] + new[q]
+            front = new
+            record_iteration(self.stats, "product_reachability", *reached)
+
+        result = sum(
+            (reached[q] for q in np.flatnonzero(other.final_mask)), empty
+        ).tocsc()
+
+        return BooleanDecomposition.matrix_converter(
+            result @ sparse.diags(self.final_mask, dtype=bool)
+        )
+
+    def reachable_from(self, constraint: "BooleanDecomposition", source: int) -> set:
+        """
+        Find final states reachable from one state by non-empty path accepted by constraint.
+        Only the part of product reachable from the source is explored.
+        :param constraint: constraint regular expression.
+        :param source: Index of the start state
+        :return: Set of indices of reachable final states
+        """
+
+        visited = sum(
+            self._product_levels(constraint, source),
+            csr_matrix((constraint.num_of_states, self.num_of_states), dtype=bool),
+        )
+
+        reached = np.zeros(self.num_of_states, dtype=bool)
+        reached[visited[np.flatnonzero(constraint.final_mask)].indices] = True
+
+        return set(np.flatnonzero(reached & self.final_mask).tolist())
+
+    def path_exists(
+        self, constraint: "BooleanDecomposition", source: int, target: int
+    ) -> bool:
+        """
+        Check if there is non-empty path from source to target accepted by constraint.
+        Traversal stops on the level where the target is reached.
+        :param constraint: constraint regular expression.
+        :param source: Index of the start state
+        :param target: Index of the final state
+        :return: True if such path exists
+        """
+
+        for level in self._product_levels(constraint, source):
+            if constraint.final_mask[level[:, [target]].nonzero()[0]].any():
+                return True
+        return False
+
+    def _product_levels(self, constraint: "BooleanDecomposition", source: int):
+        """
+        BFS over product with constraint from one state, front is k x n matrix of pairs
+        (constraint state, own state), where k is the number of constraint states.
+        :param constraint: constraint regular expression.
+        :param source: Index of the start state
+        :return: Generator of pairs first visited on every level
+        """
+
+        k = constraint.num_of_states
+        symbols = self.boolean_matrices.keys() & constraint.boolean_matrices.keys()
+        transitions = [
+            (
+                BooleanDecomposition.matrix_converter(
+                    constraint.boolean_matrices[symbol].T
+                ),
+                self.boolean_matrices[symbol],
+            )
+            for symbol in symbols
+        ]
+
+        constraint_starts = np.flatnonzero(constraint.start_mask)
+        front = csr_matrix(
+            (
+                np.ones(len(constraint_starts), dtype=bool),
+                (constraint_starts, np.full(len(constraint_starts), source)),
+            ),
+            shape=(k, self.num_of_states),
+        )
+        visited = csr_matrix(front.shape, dtype=bool)
+
+        while front.nnz > 0 and transitions:
+            reached = sum(
+                constraint_matrix @ front @ matrix
+                for constraint_matrix, matrix in transitions
+            )
+            front = BooleanDecomposition.matrix_converter(reached > visited)
+            visited = visited + front
+            record_iteration(self.stats, "product_levels", visited)
+            yield front
+
+    def transitive_closure(self, semi_naive: bool = False):
         """
         Get transitive closure of BooleanDecomposition
+        :param semi_naive: True to multiply only pairs discovered on the previous iteration against the closure,
+                False to square the whole closure on every iteration.
         :return: Transitive closure
         """
 
         if len(self.boolean_matrices) == 0:
             return BooleanDecomposition.matrix_converter(
-                sparse.csr_matrix((0, 0), dtype=bool)
+                sparse.csr_matrix((self.num_of_states, self.num_of_states), dtype=bool)
             )
-        closure = sum(self.boolean_matrices.values())
+        with phase(self.stats, "closure"):
+            closure = sum(self.boolean_matrices.values())
 
-        prev = closure.nnz
-        curr = 0
+            if semi_naive:
+                return _semi_naive_closure(closure, self.stats)
 
-        while prev != curr:
-            closure += closure @ closure
-            prev = curr
-            curr = closure.nnz
+            prev = closure.nnz
+            curr = 0
 
-        return closure
+            while prev != curr:
+                closure += closure @ closure
+                prev = curr
+                curr = closure.nnz
+                record_iteration(self.stats, "closure", closure)
 
-    def _direct_matrix_sum(self, other: "BooleanDecomposition"):
-        result = BooleanDecomposition()
-
-        states = self.states.union(
-            {State(state.value + self.num_of_states) for state in other.states}
-        )
+            return closure
 
-        boolean_matrices = {}
+    def _direct_matrix_sum(
+        self, other: "BooleanDecomposition", parallelism: Parallelism = None
+    ):
+        """
+        Build direct sum of per-symbol matrices of two automata.
+        Parallelism is passed explicitly, since the left operand is usually a shared cached regex decomposition.
+        :param other: Lower right block of the sum
+        :param parallelism: Parallelism for per-symbol sums, sequential if None
+        :return: Direct sum as BooleanDecomposition
+        """
 
-        common_symbols = set(self.boolean_matrices.keys()).intersection(
-            other.boolean_matrices.keys()
-        )
+        result = BooleanDecomposition()
 
-        for symbol in common_symbols:
-            boolean_matrices[symbol] = sparse.bmat(
-                [
-                    [self.boolean_matrices[symbol], None],
-                    [None, other.boolean_matrices[symbol]],
-                ]
+        common_symbols = list(
+            set(self.boolean_matrices.keys()).intersection(
+                other.boolean_matrices.keys()
             )
+        )
 
-        other_start_states = {
-            State(state.value + self.num_of_states) for state in other.start_states
-        }
-        other_final_states = {
-            State(state.value + self.num_of_states) for state in other.final_states
-        }
-
-        for left_state, left_index in self.indexed_states.items():
-            for right_state, right_index in other.indexed_states.items():
-                state = left_index * other.num_of_states + right_index
-                result.indexed_states[state] = state
+        sums = parallel_map(
+            parallelism,
+            _block_diag,
+            [
+                (self.boolean_matrices[symbol], other.boolean_matrices[symbol])
+                for symbol in common_symbols
+            ],
+        )
+        result.boolean_matrices = dict(zip(common_symbols, sums))
 
-        result.states = states
         result.num_of_states = self.num_of_states + other.num_of_states
-        result.start_states = {state for state in self.start_states}.union(
-            other_start_states
-        )
-        result.final_states = {state for state in self.final_states}.union(
-            other_final_states
-        )
-        result.boolean_matrices = boolean_matrices
+        result.start_mask = np.concatenate([self.start_mask, other.start_mask])
+        result.final_mask = np.concatenate([self.final_mask, other.final_mask])
 
         return result
 
@@ -193,21 +422,11 @@ class BooleanDecomposition:
         :return: Reachable vertices.
         """
         k = constraint.num_of_states
-        n = self.num_of_states
-
-        start_states_indices = [
-            i for i, st in enumerate(self.states) if st in self.start_states
-        ]
 
-        final_states_indices = [
-            i for i, st in enumerate(self.states) if st in self.final_states
-        ]
-
-        constraint_final_state_indices = [
-            i for i, st in enumerate(constraint.states) if st in constraint.final_states
-        ]
+        start_states_indices = np.flatnonzero(self.start_mask)
 
-        direct_sum = constraint._direct_matrix_sum(self)
+        with phase(self.stats, "direct_sum"):
+            direct_sum = constraint._direct_matrix_sum(self, self.parallelism)
 
         front = (
             _construct_front(self, constraint)
@@ -215,90 +434,336 @@ class BooleanDecomposition:
             else _construct_sep_front(self, constraint)
         )
 
-        visited = BooleanDecomposition.matrix_converter(csr_matrix(front.shape))
+        with phase(self.stats, "bfs"), shared_matrices(
+            self.parallelism, direct_sum.boolean_matrices.values()
+        ) as matrices:
+            visited = _constraint_bfs(matrices, front, k, self.parallelism, self.stats)
 
-        while True:
-            old_visited = visited.copy()
+        rows, cols = _accepted_pairs(visited, self, constraint)
 
-            for _, matrix in direct_sum.boolean_matrices.items():
-                if front is not None:
-                    front2 = front @ matrix
-                else:
-                    front2 = visited @ matrix
+        if not separated:
+            return set(cols.tolist())
+        return set(zip(start_states_indices[rows // k].tolist(), cols.tolist()))
 
-                visited += _transform_rows(front2, k)
+    def constraint_bfs_batched(
+        self, constraint: "BooleanDecomposition", batch_size: int
+    ):
+        """
+        Traverse presented graph via BFS with constraint separately for every start vertex,
+        processing start vertices in batches so that memory is bounded by the batch size.
+        :param constraint: constraint regular expression.
+        :param batch_size: Number of start vertices traversed together.
+        :return: Generator of pairs (start vertex, reachable final vertex).
+        """
 
-            front = None
+        if batch_size < 1:
+            raise ValueError("Batch size must be positive")
 
-            if visited.nnz == old_visited.nnz:
-                break
+        k = constraint.num_of_states
 
-        result = set()
-        for i, j in zip(*visited.nonzero()):
-            if j >= k and i % k in constraint_final_state_indices:
-                if j - k in final_states_indices:
-                    result.add(
-                        j - k
-                        if not separated
-                        else (start_states_indices[i // n], j - k)
-                    )
+        start_states_indices = np.flatnonzero(self.start_mask)
 
-        return result
+        with phase(self.stats, "direct_sum"):
+            direct_sum = constraint._direct_matrix_sum(self, self.parallelism)
 
+        with shared_matrices(
+            self.parallelism, direct_sum.boolean_matrices.values()
+        ) as matrices:
+            for begin in range(0, len(start_states_indices), batch_size):
+                batch = start_states_indices[begin : begin + batch_size]
 
-def _construct_front(graph: "BooleanDecomposition", constraint: "BooleanDecomposition"):
-    n = graph.num_of_states
-    k = constraint.num_of_states
+                front = _construct_sep_front(self, constraint, batch)
 
-    front = lil_matrix((k, n + k))
+                visited = _constraint_bfs(
+                    matrices, front, k, self.parallelism, self.stats
+                )
+
+                rows, cols = _accepted_pairs(visited, self, constraint)
+
+                yield from zip(batch[rows // k].tolist(), cols.tolist())
 
-    right_part_front = lil_array(
-        [[state in graph.start_states for state in graph.states]]
+
+def _constraint_bfs(
+    matrices: list,
+    front,
+    k: int,
+    parallelism: Parallelism = None,
+    stats: Stats = None,
+):
+    """
+    Level-synchronous BFS over direct sum of constraint and graph.
+    Only the front discovered on the previous level is multiplied, already visited vertices are dropped from it.
+    :param matrices: Matrices of direct sum of constraint and graph, or their shared handles
+    :param front: Initial front with rows grouped in blocks of k constraint states
+    :param k: Number of constraint states
+    :param parallelism: Parallelism for products with symbol matrices
+    :param stats: Stats recording nnz of visited matrix on every level
+    :return: Graph part of visited matrix, start configurations are included only if they are reachable again
+    """
+
+    visited = BooleanDecomposition.matrix_converter(
+        csr_matrix((front.shape[0], front.shape[1] - k), dtype=bool)
     )
 
-    for _, i in constraint.indexed_states.items():
-        front[i, i] = True
-        front[i, k:] = right_part_front
+    while front.nnz > 0:
+        reached = sum(
+            parallel_map(
+                parallelism,
+                _bfs_step,
+                [(front, matrix, k) for matrix in matrices],
+            )
+        )
+        if isinstance(reached, int):
+            break
+
+        new = BooleanDecomposition.matrix_converter(reached > visited)
+        visited += new
+        front = _with_constraint_identity(new, k)
+        record_iteration(stats, "bfs", visited)
 
-    return BooleanDecomposition.matrix_converter(front)
+    return visited
 
 
-def _construct_sep_front(
-    graph: "BooleanDecomposition", constraint: "BooleanDecomposition"
+def _accepted_pairs(
+    visited, graph: "BooleanDecomposition", constraint: "BooleanDecomposition"
 ):
-    start_indexes = {
-        i
-        for i in range(graph.num_of_states)
-        if graph.indexed_states[i] in graph.start_states
-    }
+    """
+    Select visited (row, graph vertex) pairs where both constraint state and graph vertex are final.
+    :param visited: Graph part of visited matrix
+    :return: Pair of arrays: rows of visited and indices of graph vertices
+    """
+
+    k = constraint.num_of_states
+    visited = visited.tocoo()
+    accepted = constraint.final_mask[visited.row % k] & graph.final_mask[visited.col]
+
+    return visited.row[accepted], visited.col[accepted]
+
 
-    fronts = [_construct_front(graph, constraint) for i in start_indexes]
+def _kron(left, right):
+    return BooleanDecomposition.matrix_converter(sparse.kron(left, right))
 
-    if len(fronts) > 0:
-        return BooleanDecomposition.matrix_converter(csr_matrix(vstack(fronts)))
+
+def _block_diag(left, right):
+    return BooleanDecomposition.matrix_converter(
+        sparse.bmat([[left, None], [None, right]])
+    )
+
+
+def _bfs_step(front, matrix, k: int):
+    return _transform_rows(front @ matrix, k)[:, k:]
+
+
+def _to_mask(states, size: int) -> np.ndarray:
+    """
+    Convert indices or boolean mask of states to boolean mask.
+    :param states: Iterable of state indices, boolean mask or None for no states
+    :param size: Number of states
+    :return: Boolean mask
+    """
+
+    if isinstance(states, np.ndarray) and states.dtype == bool:
+        return states
+    mask = np.zeros(size, dtype=bool)
+    if states is not None:
+        mask[np.fromiter(states, dtype=np.int64)] = True
+    return mask
+
+
+def nodes_to_mask(nodes, node_indices, size: int = None) -> np.ndarray:
+    """
+    Convert original nodes to boolean mask over their indices, unknown nodes are skipped.
+    :param nodes: Nodes or states, None for all nodes
+    :param node_indices: Dict node -> index or sorted array of node ids, where index of node is its position
+    :param size: Size of the mask, the number of indexed nodes if None
+    :return: Boolean mask
+    """
+
+    if size is None:
+        size = len(node_indices)
+    if nodes is None:
+        return np.ones(size, dtype=bool)
+
+    values = [node.value if isinstance(node, State) else node for node in nodes]
+    mask = np.zeros(size, dtype=bool)
+
+    if isinstance(node_indices, np.ndarray):
+        # Binary search touches only a few elements of possibly memory-mapped array
+        values = _comparable_values(values, node_indices.dtype)
+        positions = np.searchsorted(node_indices, values)
+        # Values are sorted, so only a suffix of them can be past the end
+        positions = positions[positions < len(node_indices)]
+        found = positions[node_indices[positions] == values[: len(positions)]]
+        mask[found] = True
+        return mask
+
+    for value in values:
+        index = node_indices.get(value)
+        if index is not None:
+            mask[index] = True
+    return mask
+
+
+def _comparable_values(values: list, dtype) -> np.ndarray:
+    """
+    Select values of the same kind as node ids of dtype and sort them.
+    """
+
+    if np.issubdtype(dtype, np.integer):
+        kinds = (int, np.integer)
+    elif np.issubdtype(dtype, np.floating):
+        kinds = (int, float, np.integer, np.floating)
     else:
-        return BooleanDecomposition.matrix_converter(
-            csr_matrix(
-                (
-                    constraint.num_of_states,
-                    constraint.num_of_states + graph.num_of_states,
-                )
-            )
+        kinds = (str, np.str_)
+    values = [
+        value
+        for value in values
+        if isinstance(value, kinds) and not isinstance(value, bool)
+    ]
+    # Values keep their own dtype, so longer strings are not truncated to the width of node ids
+    return np.sort(np.array(values)) if values else np.zeros(0, dtype=dtype)
+
+
+def build_boolean_matrix(rows, cols, size: int):
+    """
+    Build square boolean matrix from COO index arrays, duplicated entries are merged.
+    :param rows: Row indices of true entries
+    :param cols: Column indices of true entries
+    :param size: Size of the matrix
+    :return: Boolean matrix
+    """
+
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+
+    return BooleanDecomposition.matrix_converter(
+        sparse.coo_matrix(
+            (np.ones(len(rows), dtype=bool), (rows, cols)), shape=(size, size)
         )
+    )
+
+
+def _semi_naive_closure(adjacency, stats: Stats = None):
+    return extend_closure(adjacency, adjacency, stats)
+
+
+def extend_closure(closure, delta, stats: Stats = None):
+    """
+    Complete closure after new pairs are added to it.
+    Arguments are not modified, the completed closure is a new matrix.
+    :param closure: Transitively closed matrix with delta already added to it
+    :param delta: Pairs which are not joined with the closure yet
+    :param stats: Stats recording nnz of closure on every iteration
+    :return: Transitive closure
+    """
+
+    while delta.nnz > 0:
+        derived = delta @ closure + closure @ delta
+        delta = BooleanDecomposition.matrix_converter(derived > closure)
+        closure += delta
+        record_iteration(stats, "closure", closure)
+
+    return closure
+
+
+def _construct_front(graph: "BooleanDecomposition", constraint: "BooleanDecomposition"):
+    return _construct_blocks_front(
+        csr_matrix([graph.start_mask], dtype=bool), constraint
+    )
+
+
+def _construct_sep_front(
+    graph: "BooleanDecomposition",
+    constraint: "BooleanDecomposition",
+    start_indexes: np.ndarray = None,
+):
+    if start_indexes is None:
+        start_indexes = np.flatnonzero(graph.start_mask)
+
+    return _construct_blocks_front(
+        csr_matrix(
+            (
+                np.ones(len(start_indexes), dtype=bool),
+                (np.arange(len(start_indexes)), start_indexes),
+            ),
+            shape=(len(start_indexes), graph.num_of_states),
+        ),
+        constraint,
+    )
+
+
+def _construct_blocks_front(starts, constraint: "BooleanDecomposition"):
+    """
+    Build front with block of k rows for every row of starts, where k is the number of constraint states.
+    In every block only rows of constraint start states contain graph start vertices.
+    :param starts: Matrix with start graph vertices of every block in its rows
+    :param constraint: Constraint automaton
+    :return: Front
+    """
+
+    k = constraint.num_of_states
+    blocks = starts.shape[0]
+
+    block_rows = np.arange(blocks)[:, None] * k + np.flatnonzero(constraint.start_mask)
+    block_cols = np.repeat(np.arange(blocks), block_rows.shape[1])
+    block_rows = block_rows.ravel()
+
+    selector = csr_matrix(
+        (np.ones(len(block_rows), dtype=bool), (block_rows, block_cols)),
+        shape=(blocks * k, blocks),
+    )
+
+    return _with_constraint_identity(selector @ starts, k)
+
+
+def _with_constraint_identity(right, k: int):
+    """
+    Prepend constraint part to the graph part of front: identity in every block for non-empty rows.
+    :param right: Graph part of front
+    :param k: Number of constraint states
+    :return: Front
+    """
+
+    non_empty_rows = np.flatnonzero(np.diff(right.indptr) > 0)
+    left = csr_matrix(
+        (
+            np.ones(len(non_empty_rows), dtype=bool),
+            (non_empty_rows, non_empty_rows % k),
+        ),
+        shape=(right.shape[0], k),
+    )
+
+    return BooleanDecomposition.matrix_converter(
+        sparse.hstack([left, right], format="csr")
+    )
 
 
 def _transform_rows(front_part, constr_states_num: int):
-    transformed_front_part = lil_array(front_part.shape)
+    """
+    Move every row of the front to the row of the constraint state it reached, for the whole block at once.
+    Row r with constraint part having true entry in column j and non-empty graph part is merged into
+    the row r // k * k + j, where k is the number of constraint states.
+    :param front_part: Front after multiplication by direct sum matrix
+    :param constr_states_num: Number of constraint states
+    :return: Transformed front
+    """
 
-    for i, j in zip(*front_part.nonzero()):
-        if j < constr_states_num:
-            non_zero_row_right = front_part.getrow(i).tolil()[[0], constr_states_num:]
+    k = constr_states_num
+    front_part = BooleanDecomposition.matrix_converter(front_part)
+    num_of_rows = front_part.shape[0]
 
-            if non_zero_row_right.nnz > 0:
-                row_shift = i // constr_states_num * constr_states_num
-                transformed_front_part[row_shift + j, j] = 1
-                transformed_front_part[
-                    [row_shift + j], constr_states_num:
-                ] += non_zero_row_right
+    left = front_part[:, :k].tocoo()
+    right = front_part[:, k:].astype(bool)
+
+    has_right = np.diff(right.indptr) > 0
+    moved = has_right[left.row]
+    from_rows = left.row[moved]
+    to_rows = from_rows // k * k + left.col[moved]
+
+    routing = sparse.csr_matrix(
+        (np.ones(len(from_rows), dtype=bool), (to_rows, from_rows)),
+        shape=(num_of_rows, num_of_rows),
+    )
+    transformed_right = routing @ right
 
-    return BooleanDecomposition.matrix_converter(transformed_front_part)
+    return _with_constraint_identity(transformed_right, k)
@@ -0,0 +1,268 @@
+import numpy as np
+from pyformlang.finite_automaton import State, Symbol
+from scipy import sparse
+from scipy.sparse import csr_matrix, lil_matrix
+
+from project.re.boolean_decomposition import (
+    BooleanDecomposition,
+    extend_closure,
+    nodes_to_mask,
+)
+from project.re.graph_loader import load_boolean_decomposition
+from project.re.regex_cache import compile_regex
+
+
+class DynamicRpqIndex:
+    """
+    Result of regular path query maintained under insertions and deletions of labeled edges.
+    The index holds boolean matrices of the graph, adjacency of intersection of the graph with the regex dfa
+    and its transitive closure, all of them are updated in place.
+    Adjacency counts labels creating every product edge, so the edge disappears with its last label.
+    Insertion of an edge updates the closure by one outer product for every product edge it creates.
+    Deletion re-derives closure rows of product states which reached the deleted edges
+    from adjacency rows of these states and closure rows of the others,
+    or rebuilds the closure if there are more than max_rederive such rows.
+    Edges are directed and the graph is treated as a set of edges.
+    """
+
+    def __init__(
+        self,
+        graph,
+        regex: str,
+        start_nodes: set = None,
+        final_nodes: set = None,
+        max_rederive: int = 1024,
+    ):
+        """
+        :param graph: Graph, edge array of shape (m, 3) or csv path
+        :param regex: constraint regular expression
+        :param start_nodes: set of start nodes, all nodes (including added later) if None
+        :param final_nodes: set of final nodes, all nodes (including added later) if None
+        :param max_rederive: Maximal number of closure rows re-derived on deletion instead of full rebuild
+        """
+
+        self.regex_bd = compile_regex(regex).decomposition
+        graph_bd = load_boolean_decomposition(
+            graph, labels=self.regex_bd.boolean_matrices.keys()
+        )
+        self.start_nodes = start_nodes
+        self.final_nodes = final_nodes
+        self.max_rederive = max_rederive
+
+        self.node_ids = list(graph_bd.node_ids)
+        self.node_indices = {node: index for index, node in enumerate(self.node_ids)}
+
+        n = len(self.node_ids)
+        size = n * self.regex_bd.num_of_states
+        self._regex_transitions = {
+            symbol: list(zip(*matrix.nonzero()))
+            for symbol, matrix in self.regex_bd.boolean_matrices.items()
+        }
+        self._graph_matrices = {
+            symbol: lil_matrix(
+                graph_bd.boolean_matrices.get(symbol, csr_matrix((n, n), dtype=bool))
+            )
+            for symbol in self._regex_transitions
+        }
+        self._adjacency = lil_matrix(
+            sum(
+                (
+                    sparse.kron(
+                        graph_bd.boolean_matrices[symbol].astype(np.int32),
+                        matrix.astype(np.int32),
+                    )
+                    for symbol, matrix in self.regex_bd.boolean_matrices.items()
+                    if symbol in graph_bd.boolean_matrices
+                ),
+                csr_matrix((size, size), dtype=np.int32),
+            )
+        )
+
+        self._closure = self._full_closure()
+        self._pairs = None
+
+    def add_edge(self, u, label, v):
+        """
+        Add labeled edge u -> v and update the closure.
+        Edges with labels outside of the regex alphabet are ignored, their nodes are not indexed.
+        :return: None
+        """
+
+        symbol = Symbol(label)
+        graph_matrix = self._graph_matrices.get(symbol)
+        if graph_matrix is None:
+            return
+
+        u, v = self._index_of(u), self._index_of(v)
+        if graph_matrix[u, v]:
+            return
+        graph_matrix[u, v] = True
+
+        size = self._closure.shape[0]
+        for x, y in self._product_edges(symbol, u, v):
+            count = self._adjacency[x, y]
+            self._adjacency[x, y] = count + 1
+            if count > 0:
+                continue
+
+            into_x = self._closure[:, [x]] + _unit(x, size).T
+            from_y = self._closure[[y], :] + _unit(y, size)
+            self._closure = BooleanDecomposition.matrix_converter(
+                self._closure + into_x @ from_y
+            )
+
+        self._pairs = None
+
+    def remove_edge(self, u, label, v):
+        """
+        Remove labeled edge u -> v and re-derive affected part of the closure.
+        :return: None
+        """
+
+        symbol = Symbol(label)
+        u = u.value if isinstance(u, State) else u
+        v = v.value if isinstance(v, State) else v
+        graph_matrix = self._graph_matrices.get(symbol)
+        if (
+            graph_matrix is None
+            or u not in self.node_indices
+            or v not in self.node_indices
+        ):
+            return
+
+        u, v = self.node_indices[u], self.node_indices[v]
+        if not graph_matrix[u, v]:
+            return
+        graph_matrix[u, v] = False
+
+        sources = set()
+        for x, y in self._product_edges(symbol, u, v):
+            count = self._adjacency[x, y]
+            self._adjacency[x, y] = count - 1
+            if count == 1:
+                sources.add(x)
+                sources.update(self._closure[:, [x]].nonzero()[0].tolist())
+
+        if not sources:
+            return
+        if len(sources) > self.max_rederive:
+            self._closure = self._full_closure()
+        else:
+            self._rederive(np.array(sorted(sources), dtype=np.int64))
+
+        self._pairs = None
+
+    def pairs(self) -> frozenset:
+        """
+        Get result of the query: pairs (start node, final node).
+        The set is built once after an update, so lookups between updates take O(1).
+        :return: Set of pairs
+        """
+
+        if self._pairs is None:
+            self._pairs = self._extract_pairs()
+        return self._pairs
+
+    def reachable(self, u, v) -> bool:
+        """
+        Check if pair (u, v) belongs to result of the query.
+        """
+
+        return (u, v) in self.pairs()
+
+    def _index_of(self, node) -> int:
+        node = node.value if isinstance(node, State) else node
+        index = self.node_indices.get(node)
+        if index is None:
+            index = self.node_indices[node] = len(self.node_ids)
+            self.node_ids.append(node)
+            n = len(self.node_ids)
+            size = n * self.regex_bd.num_of_states
+            for graph_matrix in self._graph_matrices.values():
+                graph_matrix.resize((n, n))
+            self._adjacency.resize((size, size))
+            self._closure.resize((size, size))
+        return index
+
+    def _product_edges(self, symbol, u: int, v: int):
+        k = self.regex_bd.num_of_states
+        return [(u * k + p, v * k + q) for p, q in self._regex_transitions[symbol]]
+
+    def _full_closure(self):
+        adjacency = BooleanDecomposition.matrix_converter(self._adjacency.astype(bool))
+        return extend_closure(adjacency, adjacency)
+
+    def _rederive(self, sources: np.ndarray):
+        """
+        Recompute closure rows of sources. Rows of other states are still valid, so
+        new rows R satisfy R = A[S, others] @ C[others] + A[S] + A[S, S] @ R,
+        which is solved by iterating only over the sources.
+        """
+
+        size = self._closure.shape[0]
+        affected = np.zeros(size, dtype=bool)
+        affected[sources] = True
+        position = np.zeros(size, dtype=np.int64)
+        position[sources] = np.arange(len(sources))
+
+        rows = self._adjacency[sources, :].tocoo()
+        inner = affected[rows.col]
+        to_others = csr_matrix(
+            (
+                np.ones(int((~inner).sum()), dtype=bool),
+                (rows.row[~inner], rows.col[~inner]),
+            ),
+            shape=(len(sources), size),
+        )
+        to_sources = csr_matrix(
+            (
+                np.ones(int(inner.sum()), dtype=bool),
+                (rows.row[inner], position[rows.col[inner]]),
+            ),
+            shape=(len(sources), len(sources)),
+        )
+        adjacency_rows = csr_matrix(
+            (np.ones(rows.nnz, dtype=bool), (rows.row, rows.col)),
+            shape=(len(sources), size),
+        )
+
+        reached = BooleanDecomposition.matrix_converter(
+            adjacency_rows + to_others @ self._closure
+        )
+        delta = reached
+        while delta.nnz > 0:
+            delta = BooleanDecomposition.matrix_converter(
+                (to_sources @ delta) > reached
+            )
+            reached = reached + delta
+
+        scatter = csr_matrix(
+            (np.ones(len(sources), dtype=bool), (sources, np.arange(len(sources)))),
+            shape=(size, len(sources)),
+        )
+        self._closure = BooleanDecomposition.matrix_converter(
+            sparse.diags(~affected, dtype=bool) @ self._closure + scatter @ reached
+        )
+
+    def _extract_pairs(self) -> frozenset:
+        k = self.regex_bd.num_of_states
+        start_mask = np.outer(
+            nodes_to_mask(self.start_nodes, self.node_indices),
+            self.regex_bd.start_mask,
+        ).ravel()
+        final_mask = np.outer(
+            nodes_to_mask(self.final_nodes, self.node_indices),
+            self.regex_bd.final_mask,
+        ).ravel()
+
+        closure = self._closure.tocoo()
+        accepted = start_mask[closure.row] & final_mask[closure.col]
+
+        return frozenset(
+            (self.node_ids[i // k], self.node_ids[j // k])
+            for i, j in zip(closure.row[accepted], closure.col[accepted])
+        )
+
+
+def _unit(index: int, size: int):
+    return csr_matrix(([True], ([0], [index])), shape=(1, size), dtype=bool)
@@ -4,17 +4,22 @@ from pyformlang.finite_automaton import NondeterministicFiniteAutomaton
 from pyformlang.finite_automaton import EpsilonNFA
 from networkx import MultiGraph
 
+from project.instrumentation import Stats, phase
 
-def regex_to_dfa(regex: str) -> DeterministicFiniteAutomaton:
+
+def regex_to_dfa(regex: str, stats: Stats = None) -> DeterministicFiniteAutomaton:
     """
     Transform regular expression to minimized Deterministic finite automaton.
     :param regex: original regular expression
+    :param stats: Stats measuring nfa construction and minimization, None to disable
     :return: minimized dfa
     """
 
-    re = Regex(regex)
-    eps_nfa: EpsilonNFA = re.to_epsilon_nfa()
-    return eps_nfa.minimize()
+    with phase(stats, "regex_to_nfa"):
+        re = Regex(regex)
+        eps_nfa: EpsilonNFA = re.to_epsilon_nfa()
+    with phase(stats, "minimize_dfa"):
+        return eps_nfa.minimize()
 
 
 def graph_to_epsilon_nfa(
@@ -4,7 +4,9 @@ from collections import namedtuple
 
 from networkx import MultiGraph
 from pydot import Dot
-import csv
+
+from project.re.graph_loader import read_edge_arrays
+from project.re.graph_stats import graph_stats
 
 
 def get_graph_info_by_name(name: str):
@@ -23,6 +25,22 @@ def get_graph_info_by_name(name: str):
     return get_graph_info(graph)
 
 
+def get_graph_stats_by_name(name: str):
+    """Load a graph file by name and collect its statistics without building networkx graph.
+    :return: GraphStats with number of nodes, number of edges, all unique edge labels,
+    number of edges of every label and degree summaries
+    or None if file with passed name is not found
+    """
+
+    try:
+        graph_path = cfpq_data.download(name)
+    except FileNotFoundError:
+        print("File {name} not found".format(name=name))
+        return
+
+    return graph_stats(graph_path)
+
+
 def get_graph_info(graph: MultiGraph):
     s = set()
     for i in dict(graph.edges).values():
@@ -56,10 +74,18 @@ def save_graph_to_file(graph: Dot, filename: str):
 
 
 def read_graph_from_csv(filename):
+    """
+    Read networkx graph from csv file with rows "source destination label".
+    Use read_edge_arrays to get edges without building networkx graph.
+    :param filename: Path to the csv file
+    :return: MultiGraph
+    """
+    src, dst, label_codes, labels = read_edge_arrays(filename)
+
     graph = nx.MultiGraph()
-    with open(filename) as csvfile:
-        rows = csv.reader(csvfile, delimiter=" ")
-        for row in rows:
-            graph.add_edges_from([(int(row[0]), int(row[1]), {"label": row[2]})])
+    graph.add_edges_from(
+        (u, v, {"label": labels[code]})
+        for u, v, code in zip(src.tolist(), dst.tolist(), label_codes.tolist())
+    )
 
     return graph
@@ -0,0 +1,120 @@
+import json
+import os
+
+import numpy as np
+from pyformlang.finite_automaton import Symbol
+from scipy.sparse import csr_matrix
+
+from project.re.boolean_decomposition import BooleanDecomposition, nodes_to_mask
+from project.re.graph_loader import load_boolean_decomposition
+
+INDEX_VERSION = 1
+META_FILE = "meta.json"
+NODES_FILE = "nodes.npy"
+DATA_FILE = "data.npy"
+
+
+def save_graph_index(decomposition: BooleanDecomposition, directory):
+    """
+    Save per-label CSR arrays, node ids and labels of the graph to the index directory.
+    :param decomposition: Graph as BooleanDecomposition
+    :param directory: Directory of the index, created if it does not exist
+    :return: None
+    """
+
+    os.makedirs(directory, exist_ok=True)
+
+    node_ids = np.asarray(decomposition.node_ids)
+    if node_ids.dtype == object:
+        raise ValueError("Only numeric or string node ids can be saved to index")
+    np.save(os.path.join(directory, NODES_FILE), node_ids)
+
+    labels = []
+    max_nnz = 0
+    for code, (symbol, matrix) in enumerate(decomposition.boolean_matrices.items()):
+        matrix = csr_matrix(matrix)
+        matrix.sum_duplicates()
+        np.save(label_file(directory, code, "indptr"), matrix.indptr)
+        np.save(label_file(directory, code, "indices"), matrix.indices)
+        labels.append(symbol.value if isinstance(symbol, Symbol) else symbol)
+        max_nnz = max(max_nnz, matrix.nnz)
+
+    np.save(os.path.join(directory, DATA_FILE), np.ones(max_nnz, dtype=bool))
+
+    with open(os.path.join(directory, META_FILE), "w") as meta:
+        json.dump(
+            {
+                "version": INDEX_VERSION,
+                "num_of_states": decomposition.num_of_states,
+                "labels": labels,
+                "sorted_nodes": bool(np.all(node_ids[:-1] < node_ids[1:])),
+            },
+            meta,
+        )
+
+
+def build_graph_index(source, directory):
+    """
+    Build index from networkx graph, edge array or csv file and save it.
+    :param source: Graph, edge array of shape (m, 3) or csv path
+    :param directory: Directory of the index
+    :return: None
+    """
+
+    save_graph_index(load_boolean_decomposition(source), directory)
+
+
+def load_graph_index(
+    directory,
+    start_nodes: set = None,
+    final_nodes: set = None,
+    mmap: bool = True,
+) -> BooleanDecomposition:
+    """
+    Load graph saved by save_graph_index as BooleanDecomposition.
+    With mmap arrays are memory-mapped read-only, so pages are loaded lazily and shared between processes.
+    :param directory: Directory of the index
+    :param start_nodes: Nodes of graph to be start, all nodes if None
+    :param final_nodes: Nodes of graph to be final, all nodes if None
+    :param mmap: True to memory-map arrays, False to read them into memory
+    :return: BooleanDecomposition
+    """
+
+    with open(os.path.join(directory, META_FILE)) as meta_file:
+        meta = json.load(meta_file)
+
+    if meta["version"] != INDEX_VERSION:
+        raise ValueError(
+            "Unsupported graph index version {version}".format(version=meta["version"])
+        )
+
+    mmap_mode = "r" if mmap else None
+    n = meta["num_of_states"]
+    node_ids = np.load(os.path.join(directory, NODES_FILE), mmap_mode=mmap_mode)
+    data = np.load(os.path.join(directory, DATA_FILE), mmap_mode=mmap_mode)
+
+    result = BooleanDecomposition()
+    result.num_of_states = n
+    result.node_ids = node_ids
+    # Sorted node ids are searched directly, otherwise dict of nodes is built only if nodes are given
+    if meta.get("sorted_nodes", False):
+        result.start_mask = nodes_to_mask(start_nodes, node_ids)
+        result.final_mask = nodes_to_mask(final_nodes, node_ids)
+    else:
+        result.start_mask = result.nodes_to_mask(start_nodes)
+        result.final_mask = result.nodes_to_mask(final_nodes)
+
+    for code, label in enumerate(meta["labels"]):
+        indptr = np.load(label_file(directory, code, "indptr"), mmap_mode=mmap_mode)
+        indices = np.load(label_file(directory, code, "indices"), mmap_mode=mmap_mode)
+        result.boolean_matrices[Symbol(label)] = csr_matrix(
+            (data[: len(indices)], indices, indptr), shape=(n, n), copy=False
+        )
+
+    return result
+
+
+def label_file(directory, code: int, name: str):
+    return os.path.join(
+        directory, "label{code}.{name}.npy".format(code=code, name=name)
+    )
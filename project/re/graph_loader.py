@@ -0,0 +1,387 @@
+import os
+from collections import namedtuple
+from itertools import islice
+
+import numpy as np
+from networkx import Graph
+from pyformlang.finite_automaton import Symbol
+
+from project.re.boolean_decomposition import (
+    BooleanDecomposition,
+    build_boolean_matrix,
+    nodes_to_mask,
+)
+
+EdgeArrays = namedtuple("edge_arrays", ["src", "dst", "label_codes", "labels"])
+
+
+class EdgeIndex:
+    """
+    Edges of graph with nodes mapped densely to indices and grouped by label,
+    so that boolean matrices are built only for requested labels and only once.
+    """
+
+    def __init__(
+        self,
+        node_ids: list,
+        src: np.ndarray,
+        dst: np.ndarray,
+        label_values: list,
+        label_codes: np.ndarray,
+    ):
+        """
+        :param node_ids: Original node for every index
+        :param src: Indices of edge sources
+        :param dst: Indices of edge destinations
+        :param label_values: Distinct labels
+        :param label_codes: Index in label_values of every edge label
+        """
+
+        self.node_ids = node_ids
+        self.node_indices = {node: index for index, node in enumerate(node_ids)}
+        self.labels = {label: code for code, label in enumerate(label_values)}
+
+        order = np.argsort(label_codes, kind="stable")
+        self._src = src[order]
+        self._dst = dst[order]
+        self._bounds = np.searchsorted(
+            label_codes[order], np.arange(len(label_values) + 1)
+        )
+        self._matrices = dict()
+
+    @property
+    def num_of_nodes(self) -> int:
+        return len(self.node_ids)
+
+    def label_edges(self, label):
+        """
+        Get edges with the label.
+        :param label: Label or Symbol
+        :return: Pair of arrays of source and destination indices
+        """
+
+        code = self.labels.get(_label_value(label))
+        if code is None:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        begin, end = self._bounds[code], self._bounds[code + 1]
+        return self._src[begin:end], self._dst[begin:end]
+
+    def edge_count(self, label) -> int:
+        return len(self.label_edges(label)[0])
+
+    def matrix(self, label):
+        """
+        Get boolean matrix of the label, it is built on the first request.
+        :param label: Label or Symbol
+        :return: Boolean matrix
+        """
+
+        label = _label_value(label)
+        if label not in self._matrices:
+            src, dst = self.label_edges(label)
+            self._matrices[label] = build_boolean_matrix(src, dst, self.num_of_nodes)
+        return self._matrices[label]
+
+    def decomposition(
+        self,
+        start_nodes: set = None,
+        final_nodes: set = None,
+        labels=None,
+    ) -> BooleanDecomposition:
+        """
+        Build BooleanDecomposition of the graph restricted to labels.
+        :param start_nodes: Nodes of graph to be start, all nodes if None
+        :param final_nodes: Nodes of graph to be final, all nodes if None
+        :param labels: Labels or Symbols to build matrices for, all labels if None
+        :return: BooleanDecomposition
+        """
+
+        if labels is None:
+            labels = self.labels.keys()
+        labels = [label for label in map(_label_value, labels) if label in self.labels]
+
+        result = BooleanDecomposition()
+        result.num_of_states = self.num_of_nodes
+        result.boolean_matrices = {
+            Symbol(label): self.matrix(label) for label in labels
+        }
+        result.node_ids = self.node_ids
+        result.node_indices = self.node_indices
+        result.start_mask = nodes_to_mask(start_nodes, self.node_indices)
+        result.final_mask = nodes_to_mask(final_nodes, self.node_indices)
+
+        return result
+
+
+def graph_to_edge_index(graph: Graph, labels=None) -> EdgeIndex:
+    """
+    Build EdgeIndex of the networkx graph.
+    Edges of undirected graph are traversable in both directions, the same as for nfa built from it.
+    :param graph: Original networkx graph
+    :param labels: Labels to keep, all labels if None
+    :return: EdgeIndex with nodes indexed in order of graph nodes
+    """
+
+    node_ids = list(graph.nodes)
+    indices = {node: index for index, node in enumerate(node_ids)}
+    labels = None if labels is None else set(map(_label_value, labels))
+
+    src, dst, edge_labels = [], [], []
+    for u, v, label in graph.edges(data="label"):
+        if label is None or labels is not None and label not in labels:
+            continue
+        src.append(indices[u])
+        dst.append(indices[v])
+        edge_labels.append(label)
+        if not graph.is_directed() and u != v:
+            src.append(indices[v])
+            dst.append(indices[u])
+            edge_labels.append(label)
+
+    label_values, label_codes = _encode_labels(edge_labels)
+
+    return EdgeIndex(
+        node_ids,
+        np.array(src, dtype=np.int64),
+        np.array(dst, dtype=np.int64),
+        label_values,
+        label_codes,
+    )
+
+
+def edges_to_edge_index(edges: np.ndarray) -> EdgeIndex:
+    """
+    Build EdgeIndex of the directed graph given by edge array.
+    :param edges: Array of shape (m, 3) with source node, destination node and label in every row
+    :return: EdgeIndex with nodes indexed in order of sorted node ids
+    """
+
+    edges = np.asarray(edges)
+    if edges.size == 0:
+        edges = edges.reshape(0, 3)
+
+    node_values, inverse = np.unique(
+        np.concatenate([edges[:, 0], edges[:, 1]]), return_inverse=True
+    )
+
+    m = edges.shape[0]
+    label_values, label_codes = _encode_labels(edges[:, 2].tolist())
+
+    return EdgeIndex(
+        node_values.tolist(), inverse[:m], inverse[m:], label_values, label_codes
+    )
+
+
+def csv_to_edge_index(filename, chunk_size: int = 1000000) -> EdgeIndex:
+    """
+    Build EdgeIndex of the directed graph saved as csv with rows "source destination label".
+    :param filename: Path to the csv file
+    :param chunk_size: Number of rows parsed at once
+    :return: EdgeIndex with nodes indexed in order of sorted node ids
+    """
+
+    return edge_arrays_to_edge_index(read_edge_arrays(filename, chunk_size))
+
+
+def read_edge_arrays(filename, chunk_size: int = 1000000) -> EdgeArrays:
+    """
+    Read edges of csv file with rows "source destination label" by chunks into numpy arrays.
+    Source and destination must be integers.
+    :param filename: Path to the csv file
+    :param chunk_size: Number of rows parsed at once
+    :return: EdgeArrays with sources, destinations, label codes and distinct labels
+    """
+
+    src_chunks, dst_chunks, code_chunks = [], [], []
+    label_codes = dict()
+
+    for src, dst, edge_labels in iter_edge_chunks(filename, chunk_size):
+        chunk_labels, inverse = np.unique(edge_labels, return_inverse=True)
+        codes = np.array(
+            [
+                label_codes.setdefault(label, len(label_codes))
+                for label in chunk_labels.tolist()
+            ],
+            dtype=np.int64,
+        )
+
+        src_chunks.append(src)
+        dst_chunks.append(dst)
+        code_chunks.append(codes[inverse.ravel()])
+
+    def concatenate(chunks):
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+
+    return EdgeArrays(
+        concatenate(src_chunks),
+        concatenate(dst_chunks),
+        concatenate(code_chunks),
+        list(label_codes),
+    )
+
+
+def iter_edge_chunks(filename, chunk_size: int = 1000000):
+    """
+    Iterate over edges of csv file with rows "source destination label" by chunks.
+    Only one chunk of lines is held in memory at once, blank lines are skipped.
+    :param filename: Path to the csv file
+    :param chunk_size: Number of rows parsed at once
+    :return: Generator of triples of arrays: integer sources, integer destinations and string labels
+    """
+
+    with open(filename) as file:
+        while True:
+            lines = list(islice(file, chunk_size))
+            if not lines:
+                return
+
+            lines = [line for line in lines if line.strip()]
+            if not lines:
+                continue
+
+            rows = np.loadtxt(lines, dtype=str, delimiter=" ", comments=None, ndmin=2)
+
+            yield rows[:, 0].astype(np.int64), rows[:, 1].astype(np.int64), rows[:, 2]
+
+
+def edge_arrays_to_edge_index(edge_arrays: EdgeArrays) -> EdgeIndex:
+    """
+    Build EdgeIndex from edge arrays, nodes are mapped densely to indices.
+    :param edge_arrays: EdgeArrays
+    :return: EdgeIndex with nodes indexed in order of sorted node ids
+    """
+
+    m = len(edge_arrays.src)
+    node_values, inverse = np.unique(
+        np.concatenate([edge_arrays.src, edge_arrays.dst]), return_inverse=True
+    )
+
+    return EdgeIndex(
+        node_values.tolist(),
+        inverse[:m],
+        inverse[m:],
+        edge_arrays.labels,
+        edge_arrays.label_codes,
+    )
+
+
+def edge_arrays_to_matrices(edge_arrays: EdgeArrays):
+    """
+    Build boolean matrix for every label from edge arrays.
+    :param edge_arrays: EdgeArrays
+    :return: Pair of node id for every index and dict label -> boolean matrix
+    """
+
+    edge_index = edge_arrays_to_edge_index(edge_arrays)
+
+    return edge_index.node_ids, {
+        label: edge_index.matrix(label) for label in edge_arrays.labels
+    }
+
+
+def load_edge_index(source, labels=None) -> EdgeIndex:
+    """
+    Build EdgeIndex from networkx graph, edge array or path to csv file.
+    :param source: Graph, edge array of shape (m, 3) or csv path
+    :param labels: Labels to keep when reading networkx graph, all labels if None
+    :return: EdgeIndex
+    """
+
+    if isinstance(source, Graph):
+        return graph_to_edge_index(source, labels)
+    if isinstance(source, (str, os.PathLike)):
+        return csv_to_edge_index(source)
+    return edges_to_edge_index(source)
+
+
+def graph_to_boolean_decomposition(
+    graph: Graph,
+    start_nodes: set = None,
+    final_nodes: set = None,
+    labels=None,
+) -> BooleanDecomposition:
+    """
+    Build BooleanDecomposition of the networkx graph without intermediate automaton.
+    Edges of undirected graph are traversable in both directions, the same as for nfa built from it.
+    :param graph: Original networkx graph
+    :param start_nodes: Nodes of graph to be start, all nodes if None
+    :param final_nodes: Nodes of graph to be final, all nodes if None
+    :param labels: Labels to build matrices for, all labels if None
+    :return: BooleanDecomposition with states indexed in order of graph nodes
+    """
+
+    return graph_to_edge_index(graph, labels).decomposition(start_nodes, final_nodes)
+
+
+def edges_to_boolean_decomposition(
+    edges: np.ndarray,
+    start_nodes: set = None,
+    final_nodes: set = None,
+    labels=None,
+) -> BooleanDecomposition:
+    """
+    Build BooleanDecomposition of the directed graph given by edge array.
+    :param edges: Array of shape (m, 3) with source node, destination node and label in every row
+    :param start_nodes: Nodes of graph to be start, all nodes if None
+    :param final_nodes: Nodes of graph to be final, all nodes if None
+    :param labels: Labels to build matrices for, all labels if None
+    :return: BooleanDecomposition with states indexed in order of sorted node ids
+    """
+
+    return edges_to_edge_index(edges).decomposition(start_nodes, final_nodes, labels)
+
+
+def csv_to_boolean_decomposition(
+    filename,
+    start_nodes: set = None,
+    final_nodes: set = None,
+    labels=None,
+) -> BooleanDecomposition:
+    """
+    Build BooleanDecomposition of the directed graph saved as csv with rows "source destination label".
+    :param filename: Path to the csv file
+    :param start_nodes: Nodes of graph to be start, all nodes if None
+    :param final_nodes: Nodes of graph to be final, all nodes if None
+    :param labels: Labels to build matrices for, all labels if None
+    :return: BooleanDecomposition with states indexed in order of sorted node ids
+    """
+
+    return csv_to_edge_index(filename).decomposition(start_nodes, final_nodes, labels)
+
+
+def load_boolean_decomposition(
+    source,
+    start_nodes: set = None,
+    final_nodes: set = None,
+    labels=None,
+) -> BooleanDecomposition:
+    """
+    Build BooleanDecomposition from networkx graph, edge array or path to csv file.
+    :param source: Graph, edge array of shape (m, 3) or csv path
+    :param start_nodes: Nodes of graph to be start, all nodes if None
+    :param final_nodes: Nodes of graph to be final, all nodes if None
+    :param labels: Labels to build matrices for, all labels if None
+    :return: BooleanDecomposition
+    """
+
+    return load_edge_index(source, labels).decomposition(
+        start_nodes, final_nodes, labels
+    )
+
+
+def _label_value(label):
+    return label.value if isinstance(label, Symbol) else label
+
+
+def _encode_labels(labels: list):
+    values = []
+    indices = dict()
+    codes = np.empty(len(labels), dtype=np.int64)
+    for i, label in enumerate(labels):
+        code = indices.get(label)
+        if code is None:
+            code = indices[label] = len(values)
+            values.append(label)
+        codes[i] = code
+    return values, codes
@@ -0,0 +1,116 @@
+import json
+import os
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from project.re.graph_index import META_FILE, NODES_FILE, label_file
+from project.re.graph_loader import iter_edge_chunks
+
+GraphStats = namedtuple(
+    "graph_stats",
+    ["nodes", "edges", "labels", "label_counts", "out_degree", "in_degree"],
+)
+DegreeSummary = namedtuple("degree_summary", ["min", "max", "mean"])
+
+
+def graph_stats(source, chunk_size: int = 1000000) -> GraphStats:
+    """
+    Collect statistics of the graph saved as csv file or as graph index directory.
+    Edges are streamed, so memory is proportional to the number of nodes only.
+    :param source: Path to csv file with rows "source destination label" or to directory of save_graph_index
+    :param chunk_size: Number of csv rows parsed at once
+    :return: GraphStats with the same nodes, edges and labels as graf_info,
+    number of edges of every label and summaries of out and in degrees
+    """
+
+    if os.path.isdir(source):
+        return graph_index_stats(source)
+    return csv_graph_stats(source, chunk_size)
+
+
+def csv_graph_stats(filename, chunk_size: int = 1000000) -> GraphStats:
+    """
+    Collect statistics of the graph saved as csv with rows "source destination label"
+    in one pass over the file.
+    :param filename: Path to the csv file
+    :param chunk_size: Number of rows parsed at once
+    :return: GraphStats
+    """
+
+    node_ids = np.zeros(0, dtype=np.int64)
+    out_degrees = np.zeros(0, dtype=np.int64)
+    in_degrees = np.zeros(0, dtype=np.int64)
+    label_counts = Counter()
+
+    for src, dst, edge_labels in iter_edge_chunks(filename, chunk_size):
+        chunk_labels, counts = np.unique(edge_labels, return_counts=True)
+        label_counts.update(dict(zip(chunk_labels.tolist(), counts.tolist())))
+
+        m = len(src)
+        node_ids, inverse = np.unique(
+            np.concatenate([node_ids, src, dst]), return_inverse=True
+        )
+        inverse = inverse.ravel()
+        old, new_src, new_dst = np.split(
+            inverse, [len(out_degrees), len(out_degrees) + m]
+        )
+        out_degrees = _accumulate(old, out_degrees, new_src, len(node_ids))
+        in_degrees = _accumulate(old, in_degrees, new_dst, len(node_ids))
+
+    return GraphStats(
+        len(node_ids),
+        int(out_degrees.sum()),
+        set(label_counts),
+        dict(label_counts),
+        _summary(out_degrees),
+        _summary(in_degrees),
+    )
+
+
+def graph_index_stats(directory) -> GraphStats:
+    """
+    Collect statistics of the graph saved by save_graph_index.
+    Arrays are memory-mapped and read sequentially label by label.
+    Edges are counted once per label as they are stored in the index.
+    :param directory: Directory of the index
+    :return: GraphStats
+    """
+
+    with open(os.path.join(directory, META_FILE)) as meta_file:
+        meta = json.load(meta_file)
+
+    n = meta["num_of_states"]
+    out_degrees = np.zeros(n, dtype=np.int64)
+    in_degrees = np.zeros(n, dtype=np.int64)
+    label_counts = dict()
+
+    for code, label in enumerate(meta["labels"]):
+        indptr = np.load(label_file(directory, code, "indptr"), mmap_mode="r")
+        indices = np.load(label_file(directory, code, "indices"), mmap_mode="r")
+        out_degrees += np.diff(indptr)
+        in_degrees += np.bincount(indices, minlength=n)
+        label_counts[label] = label_counts.get(label, 0) + len(indices)
+
+    nodes = len(np.load(os.path.join(directory, NODES_FILE), mmap_mode="r"))
+
+    return GraphStats(
+        nodes,
+        int(out_degrees.sum()),
+        set(label_counts),
+        label_counts,
+        _summary(out_degrees),
+        _summary(in_degrees),
+    )
+
+
+def _accumulate(old: np.ndarray, degrees: np.ndarray, new: np.ndarray, size: int):
+    result = np.zeros(size, dtype=np.int64)
+    result[old] = degrees
+    return result + np.bincount(new, minlength=size)
+
+
+def _summary(degrees: np.ndarray) -> DegreeSummary:
+    if len(degrees) == 0:
+        return DegreeSummary(0, 0, 0.0)
+    return DegreeSummary(int(degrees.min()), int(degrees.max()), float(degrees.mean()))
@@ -0,0 +1,255 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy import sparse
+
+
+def parallel_map(parallelism, func, args_list) -> list:
+    """
+    Call func for every tuple of arguments, in pool if parallelism is given.
+    :param parallelism: Parallelism or None to call func sequentially
+    :param func: Module-level function
+    :param args_list: Iterable of tuples of arguments
+    :return: List of results in order of arguments
+    """
+
+    if parallelism is None:
+        return [func(*args) for args in args_list]
+    return parallelism.map(func, args_list)
+
+
+@contextmanager
+def shared_matrices(parallelism, matrices):
+    """
+    Context manager placing matrices used by many map calls to shared memory once.
+    :param parallelism: Parallelism or None
+    :param matrices: Sparse matrices
+    :return: List of arguments to pass to map instead of matrices
+    """
+
+    if parallelism is None:
+        yield list(matrices)
+        return
+
+    handles = parallelism.share(matrices)
+    try:
+        yield handles
+    finally:
+        parallelism.release(handles)
+
+
+EXECUTOR_KINDS = ("thread", "process")
+
+# Maximal number of shared matrices kept attached by every worker process
+ATTACHED_LIMIT = 64
+
+
+class Parallelism:
+    """
+    Executor for independent per-symbol matrix operations.
+    In process mode CSR buffers of arguments are passed to workers through shared memory
+    instead of pickling them. Matrices passed to many map calls can be shared once by share,
+    then workers attach their buffers without copying and keep them attached between calls.
+    """
+
+    def __init__(self, kind: str = "thread", max_workers: int = None):
+        """
+        :param kind: "thread" or "process"
+        :param max_workers: Number of workers, default of concurrent.futures if None
+        """
+
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError("Unknown executor kind {kind}".format(kind=kind))
+        self.kind = kind
+        self.max_workers = max_workers
+        self._executor = None
+        # Key of shared matrix -> (matrix, its shared memory blocks)
+        self._shared = dict()
+
+    def map(self, func, args_list) -> list:
+        """
+        Call func for every tuple of arguments in pool.
+        :param func: Module-level function (it is pickled by reference in process mode)
+        :param args_list: List of tuples of arguments
+        :return: List of results in order of arguments
+        """
+
+        args_list = list(args_list)
+        if len(args_list) <= 1:
+            return [func(*map(self._unshare, args)) for args in args_list]
+
+        executor = self._get_executor()
+        if self.kind == "thread":
+            return list(executor.map(lambda args: func(*args), args_list))
+
+        blocks = []
+        # id of argument -> its handle, so arguments repeated in args_list are copied once
+        handles = dict()
+        try:
+            shared_args = [
+                tuple(_share(arg, blocks, handles) for arg in args)
+                for args in args_list
+            ]
+            return list(
+                executor.map(_call_shared, [func] * len(args_list), shared_args)
+            )
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    def share(self, matrices) -> list:
+        """
+        Place matrices to shared memory until they are released.
+        Workers keep released matrices mapped until they are evicted by ATTACHED_LIMIT newer ones.
+        :param matrices: Sparse matrices
+        :return: Handles to pass to map instead of matrices, matrices themselves in thread mode
+        """
+
+        if self.kind == "thread":
+            return list(matrices)
+
+        handles = []
+        for matrix in matrices:
+            blocks = []
+            handle = _SharedCsr(matrix.tocsr(), blocks, persistent=True)
+            self._shared[handle.key] = (matrix, blocks)
+            handles.append(handle)
+        return handles
+
+    def release(self, handles):
+        """
+        Free shared memory of handles returned by share.
+        :param handles: Handles
+        :return: None
+        """
+
+        for handle in handles:
+            if isinstance(handle, _SharedCsr) and handle.key in self._shared:
+                _, blocks = self._shared.pop(handle.key)
+                for block in blocks:
+                    block.close()
+                    block.unlink()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _unshare(self, arg):
+        if isinstance(arg, _SharedCsr) and arg.key in self._shared:
+            return self._shared[arg.key][0]
+        return arg
+
+    def _get_executor(self):
+        if self._executor is None:
+            executor_class = (
+                ThreadPoolExecutor if self.kind == "thread" else ProcessPoolExecutor
+            )
+            self._executor = executor_class(max_workers=self.max_workers)
+        return self._executor
+
+    def __getstate__(self):
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "_executor": None,
+            "_shared": dict(),
+        }
+
+
+class _SharedCsr:
+    """
+    Description of CSR matrix which buffers are placed to shared memory.
+    """
+
+    def __init__(self, matrix, blocks: list, persistent: bool = False):
+        """
+        :param matrix: CSR matrix
+        :param blocks: List to append created shared memory blocks to
+        :param persistent: True if the matrix is shared for many calls and may be kept attached by workers
+        """
+
+        self.shape = matrix.shape
+        self.matrix_class = type(matrix)
+        self.persistent = persistent
+        self.buffers = [
+            _to_shared_memory(array, blocks)
+            for array in (matrix.data, matrix.indices, matrix.indptr)
+        ]
+
+    @property
+    def key(self) -> str:
+        return self.buffers[0][0]
+
+    def attach(self):
+        opened = []
+        arrays = [_from_shared_memory(buffer, opened) for buffer in self.buffers]
+        matrix = self.matrix_class(tuple(arrays), shape=self.shape, copy=True)
+        del arrays
+        for block in opened:
+            block.close()
+        return matrix
+
+    def attach_cached(self):
+        """
+        Get matrix viewing shared buffers without copying, it stays attached in this process
+        until ATTACHED_LIMIT other matrices are attached.
+        """
+
+        if self.key in _attached:
+            _attached.move_to_end(self.key)
+            return _attached[self.key][0]
+
+        opened = []
+        arrays = [_from_shared_memory(buffer, opened) for buffer in self.buffers]
+        matrix = self.matrix_class(tuple(arrays), shape=self.shape, copy=False)
+        _attached[self.key] = (matrix, opened)
+
+        while len(_attached) > ATTACHED_LIMIT:
+            _, (evicted, blocks) = _attached.popitem(last=False)
+            del evicted
+            for block in blocks:
+                try:
+                    block.close()
+                except BufferError:
+                    pass
+
+        return matrix
+
+
+# Shared matrices attached by this worker process: key -> (matrix, shared memory blocks)
+_attached = OrderedDict()
+
+
+def _share(arg, blocks: list, handles: dict):
+    if not sparse.issparse(arg):
+        return arg
+    if id(arg) not in handles:
+        handles[id(arg)] = _SharedCsr(arg.tocsr(), blocks)
+    return handles[id(arg)]
+
+
+def _call_shared(func, args):
+    return func(*(_attach(arg) if isinstance(arg, _SharedCsr) else arg for arg in args))
+
+
+def _attach(handle: _SharedCsr):
+    return handle.attach_cached() if handle.persistent else handle.attach()
+
+
+def _to_shared_memory(array: np.ndarray, blocks: list):
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    blocks.append(block)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block.name, array.shape, array.dtype.str
+
+
+def _from_shared_memory(buffer, opened: list):
+    name, shape, dtype = buffer
+    block = shared_memory.SharedMemory(name=name)
+    opened.append(block)
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
@@ -0,0 +1,208 @@
+from collections import namedtuple
+
+from project.instrumentation import Stats, phase
+from project.re.boolean_decomposition import BooleanDecomposition
+from project.re.graph_loader import EdgeIndex, load_edge_index
+from project.re.regex_cache import compile_regex
+from project.re.rpq import collapse_closure, format_pairs
+
+# Estimated bytes of one nonzero element of boolean CSR matrix (data and index)
+ENTRY_BYTES = 9
+# Estimated bytes of one row of CSR matrix (index pointer)
+ROW_BYTES = 8
+
+Plan = namedtuple(
+    "plan", ["strategy", "batch_size", "estimated_memory", "estimated_cost"]
+)
+Estimate = namedtuple("estimate", ["memory", "cost"])
+
+
+def plan_query(
+    edge_index: EdgeIndex,
+    regex_bd: BooleanDecomposition,
+    num_of_starts: int,
+    memory_budget: int = None,
+) -> Plan:
+    """
+    Choose the cheapest evaluation strategy which fits into memory budget.
+    Sizes are estimated from edge counts of labels and transitions of the regex dfa:
+    the intersection has sum over labels of (edges * transitions) edges, and the number of product states
+    reachable from one state is estimated from its average out degree b as b + b^2 + ..., bounded by the number of states.
+    If no strategy fits, start vertices are traversed in batches as large as the budget allows.
+    :param edge_index: Graph as EdgeIndex
+    :param regex_bd: BooleanDecomposition of the regex dfa
+    :param num_of_starts: Number of start vertices
+    :param memory_budget: Maximal estimated memory in bytes, unlimited if None
+    :return: Plan with strategy, batch size for "bfs_batched" and estimations
+    """
+
+    estimates = estimate_strategies(edge_index, regex_bd, num_of_starts)
+
+    fitting = [
+        strategy
+        for strategy, estimate in estimates.items()
+        if memory_budget is None or estimate.memory <= memory_budget
+    ]
+    if fitting:
+        strategy = min(fitting, key=lambda name: estimates[name].cost)
+        return Plan(strategy, None, *estimates[strategy])
+
+    # Memory of batched BFS is linear in the batch size
+    fixed = estimate_strategies(edge_index, regex_bd, 0)["bfs"].memory
+    per_start = estimate_strategies(edge_index, regex_bd, 1)["bfs"].memory - fixed
+    batch_size = int((memory_budget - fixed) // per_start)
+    if batch_size < 1:
+        raise ValueError(
+            "Query needs at least {memory} bytes, memory budget is {budget}".format(
+                memory=int(fixed + per_start), budget=memory_budget
+            )
+        )
+    batch_size = max(min(batch_size, num_of_starts), 1)
+
+    return Plan(
+        "bfs_batched",
+        batch_size,
+        int(fixed + per_start * batch_size),
+        estimates["bfs"].cost,
+    )
+
+
+def estimate_strategies(
+    edge_index: EdgeIndex, regex_bd: BooleanDecomposition, num_of_starts: int
+) -> dict:
+    """
+    Estimate peak memory in bytes and work in multiplied matrix elements of every strategy
+    evaluating all start vertices at once.
+    :param edge_index: Graph as EdgeIndex
+    :param regex_bd: BooleanDecomposition of the regex dfa
+    :param num_of_starts: Number of start vertices
+    :return: Dict strategy -> Estimate, "bfs_batched" is not included
+    """
+
+    n = edge_index.num_of_nodes
+    k = regex_bd.num_of_states
+    product_states = n * k
+
+    graph_edges = 0
+    product_edges = 0
+    transitions = 0
+    for symbol, matrix in regex_bd.boolean_matrices.items():
+        edges = edge_index.edge_count(symbol)
+        graph_edges += edges
+        product_edges += edges * matrix.nnz
+        transitions += matrix.nnz
+
+    degree = product_edges / product_states if product_states else 0
+    product_reach = _reach(degree, product_states)
+    graph_reach = min(product_reach, n)
+
+    # Pairs (start vertex, constraint state) x graph vertex visited by BFS and product-free traversal
+    visited = num_of_starts * k * graph_reach
+    graph_memory = _graph_memory(edge_index, regex_bd)
+
+    closure_memory = (
+        ENTRY_BYTES * (product_edges + product_states * product_reach)
+        + ROW_BYTES * product_states
+    )
+
+    return {
+        "closure": Estimate(
+            graph_memory + closure_memory, product_edges * max(product_reach, 1)
+        ),
+        "bfs": Estimate(
+            graph_memory
+            + ENTRY_BYTES * (graph_edges + transitions + visited + num_of_starts * k)
+            + ROW_BYTES * num_of_starts * k,
+            visited * max(degree, 1) + num_of_starts * k * k,
+        ),
+        "product_free": Estimate(
+            graph_memory + ENTRY_BYTES * visited + ROW_BYTES * n * k,
+            visited * max(degree, 1) + transitions * n,
+        ),
+    }
+
+
+def planned_path_query(
+    regex: str,
+    graph,
+    start_nodes: set = None,
+    final_nodes: set = None,
+    memory_budget: int = None,
+    stats: Stats = None,
+) -> set:
+    """
+    The function of performing regular queries to graph with strategy chosen by plan_query.
+    Returns the same pairs as request_path_query.
+    :param regex: constraint regular expression
+    :param graph: Graph, edge array of shape (m, 3) or csv path
+    :param start_nodes: set of start nodes, all nodes if None
+    :param final_nodes: set of final nodes, all nodes if None
+    :param memory_budget: Maximal estimated memory in bytes, unlimited if None
+    :param stats: Stats collecting phase timers and iterations, None to disable
+    :return: Pairs (start node, final node).
+    """
+
+    with phase(stats, "compile_regex"):
+        regex_bd = compile_regex(regex, stats=stats).decomposition
+    with phase(stats, "load_graph"):
+        edge_index = load_edge_index(graph, regex_bd.boolean_matrices.keys())
+        graph_bd = edge_index.decomposition(
+            start_nodes, final_nodes, regex_bd.boolean_matrices.keys()
+        )
+    graph_bd.stats = stats
+
+    with phase(stats, "planning"):
+        plan = plan_query(
+            edge_index, regex_bd, int(graph_bd.start_mask.sum()), memory_budget
+        )
+
+    return execute_plan(plan, graph_bd, regex_bd)
+
+
+def execute_plan(
+    plan: Plan, graph_bd: BooleanDecomposition, regex_bd: BooleanDecomposition
+) -> set:
+    """
+    Evaluate regular query with the strategy of the plan.
+    :param plan: Plan returned by plan_query
+    :param graph_bd: Graph as BooleanDecomposition with start and final states
+    :param regex_bd: BooleanDecomposition of the regex dfa
+    :return: Pairs (start node, final node).
+    """
+
+    node_ids = graph_bd.node_ids
+
+    if plan.strategy == "closure":
+        intersection = graph_bd.intersection(regex_bd)
+        closure = intersection.transitive_closure(semi_naive=True)
+        reachability = collapse_closure(
+            closure, intersection, graph_bd.num_of_states, regex_bd.num_of_states
+        )
+        return format_pairs(reachability, node_ids, "set")
+
+    if plan.strategy == "product_free":
+        return format_pairs(graph_bd.product_reachability(regex_bd), node_ids, "set")
+
+    if plan.strategy == "bfs":
+        pairs = graph_bd.constraint_bfs(regex_bd, True)
+    elif plan.strategy == "bfs_batched":
+        pairs = graph_bd.constraint_bfs_batched(regex_bd, plan.batch_size)
+    else:
+        raise ValueError("Unknown strategy {strategy}".format(strategy=plan.strategy))
+
+    return {(node_ids[i], node_ids[j]) for i, j in pairs}
+
+
+def _reach(degree: float, num_of_states: int) -> float:
+    if degree >= 1:
+        return num_of_states
+    return min(degree / (1 - degree), num_of_states)
+
+
+def _graph_memory(edge_index: EdgeIndex, regex_bd: BooleanDecomposition) -> int:
+    edges = sum(
+        edge_index.edge_count(symbol) for symbol in regex_bd.boolean_matrices.keys()
+    )
+    return ENTRY_BYTES * edges + ROW_BYTES * edge_index.num_of_nodes * len(
+        regex_bd.boolean_matrices
+    )
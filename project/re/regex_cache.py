@@ -0,0 +1,42 @@
+from collections import namedtuple
+
+from project.cache import LRUCache
+from project.instrumentation import Stats, phase
+from project.re.boolean_decomposition import BooleanDecomposition
+from project.re.fa_utils import regex_to_dfa
+
+CompiledRegex = namedtuple("compiled_regex", ["dfa", "decomposition"])
+
+regex_cache = LRUCache(maxsize=256)
+
+
+def normalize_regex(regex: str) -> str:
+    """
+    Normalize regular expression text: strip it and collapse whitespaces.
+    :param regex: Original regular expression
+    :return: Normalized regular expression
+    """
+
+    return " ".join(regex.split())
+
+
+def compile_regex(
+    regex: str, cache: LRUCache = regex_cache, stats: Stats = None
+) -> CompiledRegex:
+    """
+    Get minimized dfa of regular expression and its BooleanDecomposition, reusing them if they are cached.
+    Returned objects are shared between callers and must not be modified.
+    :param regex: Regular expression
+    :param cache: Cache of compiled regular expressions
+    :param stats: Stats measuring compilation phases on cache miss, None to disable
+    :return: Pair of dfa and its BooleanDecomposition
+    """
+
+    def compile_normalized():
+        dfa = regex_to_dfa(normalized, stats)
+        with phase(stats, "regex_decomposition"):
+            return CompiledRegex(dfa, BooleanDecomposition(dfa))
+
+    normalized = normalize_regex(regex)
+
+    return cache.get_or_create(normalized, compile_normalized)
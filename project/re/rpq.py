@@ -1,7 +1,14 @@
+import numpy as np
 from networkx import MultiGraph
+from pyformlang.finite_automaton import State
+from scipy.sparse import coo_matrix
 
+from project.instrumentation import Stats, phase
 from project.re.boolean_decomposition import BooleanDecomposition
-from project.re.fa_utils import graph_to_epsilon_nfa, regex_to_dfa
+
+from project.re.graph_loader import graph_to_boolean_decomposition
+from project.re.parallel import Parallelism
+from project.re.regex_cache import compile_regex
 
 
 def request_path_query(
@@ -9,31 +16,64 @@ def request_path_query(
     graph: MultiGraph,
     start_nodes: set = None,
     final_nodes: set = None,
+    parallelism: Parallelism = None,
+    output: str = "set",
+    stats: Stats = None,
 ):
-    graph_fa = graph_to_epsilon_nfa(graph, start_nodes, final_nodes)
-    regex_fa = regex_to_dfa(regex)
-
-    graph_bd = BooleanDecomposition(graph_fa)
-    regex_bd = BooleanDecomposition(regex_fa)
+    """
+    The function of performing regular queries to graph via transitive closure of intersection.
+    :param regex: constraint regular expression
+    :param graph: origin graph
+    :param start_nodes: set of start nodes, all nodes if None
+    :param final_nodes: set of final nodes, all nodes if None
+    :param parallelism: executor for per-symbol matrix products, sequential if None
+    :param output: "set" for set of pairs of nodes, "array" for (m, 2) array of pairs of nodes
+            (of object dtype if nodes are of different types), "matrix" for sparse n x n matrix
+            indexed in order of graph nodes.
+    :param stats: Stats collecting phase timers and closure iterations, None to disable
+    :return: Pairs (start node, final node).
+    """
+    regex_bd, graph_bd = _load(regex, graph, start_nodes, final_nodes, stats)
+    graph_bd.parallelism = parallelism
 
     intersection = graph_bd.intersection(regex_bd)
 
-    start_states = intersection.start_states
-    final_states = intersection.final_states
+    closure = intersection.transitive_closure(semi_naive=True)
+
+    with phase(stats, "extraction"):
+        reachability = collapse_closure(
+            closure, intersection, graph_bd.num_of_states, regex_bd.num_of_states
+        )
+
+        return format_pairs(reachability, graph_bd.node_ids, output)
 
-    closure = intersection.transitive_closure()
 
-    result = set()
-    for left, right in zip(*closure.nonzero()):
-        if left in start_states and right in final_states:
-            result.add(
-                (
-                    left // regex_bd.num_of_states,
-                    right // regex_bd.num_of_states,
-                )
-            )
+def rpq_product_free(
+    regex: str,
+    graph: MultiGraph,
+    start_nodes: set = None,
+    final_nodes: set = None,
+    output: str = "set",
+    stats: Stats = None,
+):
+    """
+    The function of performing regular queries to graph without materializing intersection automaton.
+    Returns the same pairs as request_path_query.
+    :param regex: constraint regular expression
+    :param graph: origin graph
+    :param start_nodes: set of start nodes, all nodes if None
+    :param final_nodes: set of final nodes, all nodes if None
+    :param output: "set", "array" or "matrix", the same as for request_path_query
+    :param stats: Stats collecting phase timers and traversal iterations, None to disable
+    :return: Pairs (start node, final node).
+    """
+    regex_bd, graph_bd = _load(regex, graph, start_nodes, final_nodes, stats)
+
+    with phase(stats, "product_reachability"):
+        reachability = graph_bd.product_reachability(regex_bd)
 
-    return result
+    with phase(stats, "extraction"):
+        return format_pairs(reachability, graph_bd.node_ids, output)
 
 
 def rpq_bfs(
@@ -42,6 +82,8 @@ def rpq_bfs(
     start_nodes: set,
     final_nodes: set,
     is_separated: bool,
+    parallelism: Parallelism = None,
+    stats: Stats = None,
 ):
     """
     The function of performing regular queries to graph.
@@ -51,14 +93,168 @@ def rpq_bfs(
     :param final_nodes: set of final nodes
     :param is_separated: separated: True if you want to get final vertices for every start vertex,
             False --- to get set of final vertices reachable from set of start vertices.
+    :param parallelism: executor for per-symbol matrix products, sequential if None
+    :param stats: Stats collecting phase timers and BFS levels, None to disable
     :return: Reachable vertices.
     """
-    graph_fa = graph_to_epsilon_nfa(graph, start_nodes, final_nodes)
-    regex_fa = regex_to_dfa(regex)
-
-    graph_bd = BooleanDecomposition(graph_fa)
-    regex_bd = BooleanDecomposition(regex_fa)
+    regex_bd, graph_bd = _load(regex, graph, start_nodes, final_nodes, stats)
+    graph_bd.parallelism = parallelism
 
     result = graph_bd.constraint_bfs(regex_bd, is_separated)
 
-    return result
+    with phase(stats, "extraction"):
+        node_ids = graph_bd.node_ids
+        if is_separated:
+            return {(node_ids[i], node_ids[j]) for i, j in result}
+        return {node_ids[j] for j in result}
+
+
+def rpq_bfs_batched(
+    regex: str,
+    graph: MultiGraph,
+    start_nodes: set,
+    final_nodes: set,
+    batch_size: int = 1024,
+    stats: Stats = None,
+):
+    """
+    The function of performing separated regular queries to graph, start nodes are processed in batches.
+    :param regex: constraint regular expression
+    :param graph: origin graph
+    :param start_nodes: set of start nodes
+    :param final_nodes: set of final nodes
+    :param batch_size: number of start nodes traversed together, peak memory is proportional to it
+    :param stats: Stats collecting phase timers and BFS levels, None to disable
+    :return: Generator of pairs (start node, reachable final node).
+    """
+    regex_bd, graph_bd = _load(regex, graph, start_nodes, final_nodes, stats)
+
+    node_ids = graph_bd.node_ids
+    for i, j in graph_bd.constraint_bfs_batched(regex_bd, batch_size):
+        yield node_ids[i], node_ids[j]
+
+
+def rpq_reachable(
+    regex: str,
+    graph: MultiGraph,
+    source,
+    final_nodes: set = None,
+) -> set:
+    """
+    The function of finding nodes reachable from one node by path matching regular expression.
+    Only the part of graph reachable from the source is traversed.
+    :param regex: constraint regular expression
+    :param graph: origin graph
+    :param source: start node
+    :param final_nodes: set of final nodes, all nodes if None
+    :return: Set of reachable final nodes.
+    """
+    regex_bd = compile_regex(regex).decomposition
+    graph_bd = graph_to_boolean_decomposition(
+        graph, None, final_nodes, regex_bd.boolean_matrices.keys()
+    )
+
+    source = _node_value(source)
+    if source not in graph_bd.node_indices:
+        return set()
+
+    node_ids = graph_bd.node_ids
+    return {
+        node_ids[i]
+        for i in graph_bd.reachable_from(regex_bd, graph_bd.node_indices[source])
+    }
+
+
+def rpq_path_exists(regex: str, graph: MultiGraph, source, target) -> bool:
+    """
+    The function of checking if there is path from source to target matching regular expression.
+    Traversal stops as soon as the target is found.
+    :param regex: constraint regular expression
+    :param graph: origin graph
+    :param source: start node
+    :param target: final node
+    :return: True if such path exists.
+    """
+    regex_bd = compile_regex(regex).decomposition
+    graph_bd = graph_to_boolean_decomposition(
+        graph, labels=regex_bd.boolean_matrices.keys()
+    )
+
+    node_indices = graph_bd.node_indices
+    source, target = _node_value(source), _node_value(target)
+    if source not in node_indices or target not in node_indices:
+        return False
+
+    return graph_bd.path_exists(regex_bd, node_indices[source], node_indices[target])
+
+
+def _load(regex: str, graph, start_nodes, final_nodes, stats: Stats):
+    """
+    Compile regex and load graph restricted to its labels.
+    :return: Pair of BooleanDecomposition of regex and of graph with stats attached
+    """
+
+    with phase(stats, "compile_regex"):
+        regex_bd = compile_regex(regex, stats=stats).decomposition
+    with phase(stats, "load_graph"):
+        graph_bd = graph_to_boolean_decomposition(
+            graph, start_nodes, final_nodes, regex_bd.boolean_matrices.keys()
+        )
+    graph_bd.stats = stats
+
+    return regex_bd, graph_bd
+
+
+def _node_value(node):
+    return node.value if isinstance(node, State) else node
+
+
+def collapse_closure(closure, intersection, n: int, k: int):
+    """
+    Slice closure of intersection by start and final states and collapse regex states.
+    :return: Sparse n x n matrix of pairs of graph states
+    """
+
+    start_indices = np.flatnonzero(intersection.start_mask)
+    final_indices = np.flatnonzero(intersection.final_mask)
+
+    accepted = closure[start_indices][:, final_indices].tocoo()
+
+    return BooleanDecomposition.matrix_converter(
+        coo_matrix(
+            (
+                np.ones(accepted.nnz, dtype=bool),
+                (start_indices[accepted.row] // k, final_indices[accepted.col] // k),
+            ),
+            shape=(n, n),
+        )
+    )
+
+
+def format_pairs(reachability, node_ids, output: str):
+    if output == "matrix":
+        return reachability
+
+    rows, cols = reachability.nonzero()
+    if output == "array":
+        return _node_array(node_ids)[np.stack([rows, cols], axis=1)]
+    if output == "set":
+        return {(node_ids[i], node_ids[j]) for i, j in zip(rows, cols)}
+
+    raise ValueError("Unknown output format {output}".format(output=output))
+
+
+def _node_array(node_ids) -> np.ndarray:
+    """
+    Array of node ids, numpy would convert ids of different types to one of them, e.g. to strings.
+    """
+
+    if len({type(node) for node in node_ids}) <= 1:
+        nodes = np.asarray(node_ids)
+        if nodes.ndim == 1:
+            return nodes
+
+    nodes = np.empty(len(node_ids), dtype=object)
+    for index, node in enumerate(node_ids):
+        nodes[index] = node
+    return nodes
@@ -0,0 +1,178 @@
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+from project.cache import LRUCache
+from project.instrumentation import Stats
+from project.re.boolean_decomposition import nodes_to_mask
+from project.re.graph_loader import load_edge_index
+from project.re.regex_cache import compile_regex, normalize_regex
+
+Query = namedtuple("query", ["regex", "start_nodes", "final_nodes", "separated"])
+
+
+class RpqSession:
+    """
+    Session of regular path queries to one graph.
+    The graph is indexed by label once and boolean matrices of a label are built when a query needs it first.
+    Separated queries of a batch with the same regular expression are answered
+    by one batched traversal from the union of their start nodes, and final nodes reachable from
+    recently queried start nodes are remembered for later batches.
+    Not separated queries with the same regular expression and start nodes are answered by one
+    traversal from all their start nodes together.
+    """
+
+    def __init__(
+        self,
+        graph,
+        batch_size: int = 1024,
+        cache_size: int = 65536,
+        stats: Stats = None,
+    ):
+        """
+        :param graph: Graph, edge array of shape (m, 3) or csv path
+        :param batch_size: Number of start nodes traversed together
+        :param cache_size: Maximal number of remembered pairs (regex, start node)
+        :param stats: Stats collecting BFS levels of all traversals, None to disable
+        """
+
+        self.edge_index = load_edge_index(graph)
+        self.batch_size = batch_size
+        self.reachable_cache = LRUCache(maxsize=cache_size)
+        self.stats = stats
+
+    def query(
+        self,
+        regex: str,
+        start_nodes: set = None,
+        final_nodes: set = None,
+        separated: bool = False,
+    ):
+        """
+        Run one query, the result is the same as of rpq_bfs.
+        :param regex: constraint regular expression
+        :param start_nodes: set of start nodes, all nodes if None
+        :param final_nodes: set of final nodes, all nodes if None
+        :param separated: True to get pairs (start node, final node), False to get set of final nodes
+        :return: Reachable nodes.
+        """
+
+        return self.run([Query(regex, start_nodes, final_nodes, separated)])[0]
+
+    def run(self, queries) -> list:
+        """
+        Run batch of queries against the shared graph decomposition.
+        :param queries: Iterable of Query or tuples (regex, start_nodes, final_nodes, separated)
+        :return: List of results in order of queries
+        """
+
+        queries = [Query(*query) for query in queries]
+        node_indices = self.edge_index.node_indices
+        regexes = [normalize_regex(query.regex) for query in queries]
+        start_masks = [
+            nodes_to_mask(query.start_nodes, node_indices) for query in queries
+        ]
+
+        separated_starts = defaultdict(
+            lambda: np.zeros(self.edge_index.num_of_nodes, dtype=bool)
+        )
+        # (regex, start mask) -> start mask of not separated queries
+        combined_starts = dict()
+        for query, regex, starts in zip(queries, regexes, start_masks):
+            if query.separated:
+                separated_starts[regex] |= starts
+            else:
+                combined_starts.setdefault((regex, starts.tobytes()), starts)
+
+        separated = {
+            regex: self._reachable(regex, np.flatnonzero(starts))
+            for regex, starts in separated_starts.items()
+        }
+        combined = {
+            key: self._reachable_from_all(key[0], starts)
+            for key, starts in combined_starts.items()
+        }
+
+        results = []
+        for query, regex, starts in zip(queries, regexes, start_masks):
+            final_mask = nodes_to_mask(query.final_nodes, node_indices)
+            if query.separated:
+                results.append(
+                    self._answer(separated[regex], np.flatnonzero(starts), final_mask)
+                )
+            else:
+                ends = combined[(regex, starts.tobytes())]
+                results.append(
+                    {self.edge_index.node_ids[end] for end in ends[final_mask[ends]]}
+                )
+
+        return results
+
+    def clear(self):
+        """
+        Forget remembered reachable nodes.
+        :return: None
+        """
+
+        self.reachable_cache.clear()
+
+    def _decomposition(self, regex_bd, start_mask: np.ndarray):
+        graph_bd = self.edge_index.decomposition(
+            labels=regex_bd.boolean_matrices.keys()
+        )
+        graph_bd.start_mask = start_mask
+        graph_bd.stats = self.stats
+        return graph_bd
+
+    def _reachable_from_all(self, regex: str, start_mask: np.ndarray) -> np.ndarray:
+        """
+        Get final nodes reachable from any of start nodes by one not separated traversal.
+        :return: Array of reachable indices
+        """
+
+        if not start_mask.any():
+            return np.zeros(0, dtype=np.int64)
+
+        regex_bd = compile_regex(regex).decomposition
+        ends = self._decomposition(regex_bd, start_mask).constraint_bfs(regex_bd, False)
+        return np.array(sorted(ends), dtype=np.int64)
+
+    def _reachable(self, regex: str, start_indices: np.ndarray) -> dict:
+        """
+        Get final nodes reachable from every start node, traversing only from nodes which are not cached.
+        :return: Dict start index -> array of reachable indices
+        """
+
+        reachable = dict()
+        missing = []
+        for index in start_indices.tolist():
+            ends = self.reachable_cache.get((regex, index))
+            if ends is None:
+                missing.append(index)
+            else:
+                reachable[index] = ends
+        if not missing:
+            return reachable
+
+        regex_bd = compile_regex(regex).decomposition
+        start_mask = np.zeros(self.edge_index.num_of_nodes, dtype=bool)
+        start_mask[missing] = True
+        graph_bd = self._decomposition(regex_bd, start_mask)
+
+        ends = {index: [] for index in missing}
+        for start, end in graph_bd.constraint_bfs_batched(regex_bd, self.batch_size):
+            ends[start].append(end)
+
+        for start, start_ends in ends.items():
+            reachable[start] = np.array(start_ends, dtype=np.int64)
+            self.reachable_cache.put((regex, start), reachable[start])
+
+        return reachable
+
+    def _answer(self, reachable: dict, start_indices: np.ndarray, final_mask):
+        node_ids = self.edge_index.node_ids
+        return {
+            (node_ids[start], node_ids[end])
+            for start in start_indices
+            for end in reachable[start][final_mask[reachable[start]]]
+        }
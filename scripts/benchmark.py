@@ -0,0 +1,255 @@
+"""
+Benchmarks of RPQ and CFPQ algorithms.
+
+Every benchmark is a phase (graph loading or one algorithm) run on one graph.
+Wall time is measured over several runs, peak memory is measured by tracemalloc in a separate run.
+Results are written as JSON and can be compared against a baseline produced by an earlier run:
+
+    python scripts/benchmark.py --output results.json
+    python scripts/benchmark.py --baseline results.json --time-threshold 0.2
+
+Phases rpq_bfs_thread and rpq_bfs_process run rpq_bfs with a pool of --workers threads or processes,
+pools are started before the measurement and are reused by all runs:
+
+    python scripts/benchmark.py --phases rpq_bfs rpq_bfs_thread rpq_bfs_process --random-nodes 20000 --random-p 0.00015
+
+The exit code is 1 if some benchmark of the baseline became slower or used more memory
+than allowed by thresholds.
+"""
+
+import argparse
+import json
+import pathlib
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import cfpq_data
+from networkx import MultiDiGraph
+from pyformlang.cfg import CFG
+
+import shared
+
+sys.path.insert(0, str(shared.ROOT))
+
+from project.cfg.cfpq import cfpq  # noqa: E402
+from project.cfg.cfpq_algo import Algo  # noqa: E402
+from project.re.graph import read_graph_from_csv  # noqa: E402
+from project.re.graph_loader import graph_to_boolean_decomposition  # noqa: E402
+from project.re.parallel import EXECUTOR_KINDS, Parallelism  # noqa: E402
+from project.re.rpq import request_path_query, rpq_bfs  # noqa: E402
+
+RESULTS_VERSION = 1
+GRAMMAR = CFG.from_text("S -> a S b | a b")
+
+
+def two_cycles_graph(n: int):
+    return cfpq_data.labeled_two_cycles_graph(n, n, labels=("a", "b"))
+
+
+def random_graph(n: int, p: float, labels=("a", "b", "c"), seed: int = 42):
+    generator = random.Random(seed)
+    graph = MultiDiGraph()
+    graph.add_nodes_from(range(n))
+    for u in range(n):
+        for v in range(n):
+            if generator.random() < p:
+                graph.add_edge(u, v, label=generator.choice(labels))
+    return graph
+
+
+def cached_graph(name: str, directory: pathlib.Path):
+    """
+    Find csv file of the dataset graph downloaded earlier, nothing is downloaded.
+    :return: Graph or None if there is no such file
+    """
+
+    for path in directory.rglob("{name}.csv".format(name=name)):
+        return read_graph_from_csv(path)
+    return None
+
+
+def build_graphs(args) -> dict:
+    graphs = {"two_cycles_{n}".format(n=n): two_cycles_graph(n) for n in args.cycles}
+    for n in args.random_nodes:
+        graphs["random_{n}_{p}".format(n=n, p=args.random_p)] = random_graph(
+            n, args.random_p
+        )
+
+    for name in args.datasets:
+        graph = cached_graph(name, args.datasets_dir)
+        if graph is None:
+            print("Graph {name} is not cached, skipped".format(name=name))
+            continue
+        graphs[name] = graph
+
+    return graphs
+
+
+def build_phases(graph, regex: str, start_nodes: set, pools: dict) -> dict:
+    """
+    :param pools: Dict kind -> Parallelism used by phases rpq_bfs_<kind>
+    """
+
+    phases = {
+        "load": lambda: graph_to_boolean_decomposition(graph),
+        "rpq_closure": lambda: request_path_query(regex, graph, start_nodes),
+        "rpq_bfs": lambda: rpq_bfs(regex, graph, start_nodes, None, True),
+        "cfpq_hellings": lambda: cfpq(graph, GRAMMAR, algo=Algo.hellings),
+        "cfpq_matrix": lambda: cfpq(graph, GRAMMAR, algo=Algo.matrix_prod),
+    }
+    for kind, parallelism in pools.items():
+        phases["rpq_bfs_" + kind] = lambda parallelism=parallelism: rpq_bfs(
+            regex, graph, start_nodes, None, True, parallelism
+        )
+    return phases
+
+
+def measure(func, repeat: int) -> dict:
+    """
+    Measure wall time of repeat runs and peak memory of one more run.
+    :return: Dict with minimal and median time in seconds and peak memory in bytes
+    """
+
+    times = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - begin)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "time": min(times),
+        "time_median": statistics.median(times),
+        "peak_memory": peak,
+    }
+
+
+def run_benchmarks(args) -> dict:
+    results = dict()
+    pools = {kind: Parallelism(kind, args.workers) for kind in EXECUTOR_KINDS}
+
+    try:
+        for graph_name, graph in build_graphs(args).items():
+            start_nodes = set(list(graph.nodes)[: args.start_nodes])
+            phases = build_phases(graph, args.regex, start_nodes, pools)
+
+            for phase in args.phases:
+                key = "{graph}/{phase}".format(graph=graph_name, phase=phase)
+                results[key] = measure(phases[phase], args.repeat)
+                print(
+                    "{key}: {time:.4f} s, {memory} B".format(
+                        key=key,
+                        time=results[key]["time"],
+                        memory=results[key]["peak_memory"],
+                    )
+                )
+    finally:
+        for parallelism in pools.values():
+            parallelism.shutdown()
+
+    return {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+
+def compare(
+    results: dict, baseline: dict, time_threshold: float, memory_threshold: float
+):
+    """
+    Find benchmarks which became worse than baseline by more than threshold.
+    :param time_threshold: Allowed relative growth of time
+    :param memory_threshold: Allowed relative growth of peak memory
+    :return: List of messages about regressions
+    """
+
+    regressions = []
+    for key, expected in baseline["results"].items():
+        actual = results["results"].get(key)
+        if actual is None:
+            continue
+
+        for metric, threshold in [
+            ("time", time_threshold),
+            ("peak_memory", memory_threshold),
+        ]:
+            if actual[metric] > expected[metric] * (1 + threshold):
+                regressions.append(
+                    "{key} {metric}: {actual} > {expected} * {limit}".format(
+                        key=key,
+                        metric=metric,
+                        actual=actual[metric],
+                        expected=expected[metric],
+                        limit=1 + threshold,
+                    )
+                )
+
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--output", type=pathlib.Path, help="File to write results to")
+    parser.add_argument("--baseline", type=pathlib.Path, help="Results to compare with")
+    parser.add_argument("--time-threshold", type=float, default=0.25)
+    parser.add_argument("--memory-threshold", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--phases",
+        nargs="+",
+        default=["load", "rpq_closure", "rpq_bfs", "cfpq_hellings", "cfpq_matrix"],
+    )
+    parser.add_argument("--cycles", type=int, nargs="*", default=[50, 200])
+    parser.add_argument("--random-nodes", type=int, nargs="*", default=[200])
+    parser.add_argument("--random-p", type=float, default=0.01)
+    parser.add_argument("--datasets", nargs="*", default=["generations", "wc"])
+    parser.add_argument(
+        "--datasets-dir",
+        type=pathlib.Path,
+        default=pathlib.Path(getattr(cfpq_data, "GRAPHS_DIR", shared.ROOT / "data")),
+        help="Directory with csv files of downloaded dataset graphs",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of workers of pool phases"
+    )
+    parser.add_argument("--regex", default="(a|b)*.b")
+    parser.add_argument(
+        "--start-nodes", type=int, default=10, help="Number of start nodes of RPQ"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = run_benchmarks(args)
+
+    if args.output is not None:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = compare(
+            results, baseline, args.time_threshold, args.memory_threshold
+        )
+        for regression in regressions:
+            print("Regression: " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
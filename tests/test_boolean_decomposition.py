@@ -2,7 +2,7 @@ import numpy as np
 from scipy import sparse
 from pyformlang.finite_automaton import NondeterministicFiniteAutomaton, State, Symbol
 
-from project.re.boolean_decomposition import BooleanDecomposition
+from project.re.boolean_decomposition import BooleanDecomposition, _transform_rows
 
 
 def dicts_equal(d1: dict, d2: dict):
@@ -89,3 +89,64 @@ def test_intersection_accept_correct_strings():
     nfa = intersection.to_nfa()
 
     assert nfa.accepts([Symbol("a"), Symbol("b")])
+
+
+def test_from_edges_equals_automaton_decomposition():
+    expected = build_test_boolean_decomposition1()
+
+    actual = BooleanDecomposition.from_edges(
+        3,
+        {
+            Symbol("a"): ([0, 0, 0], [1, 2, 1]),
+            Symbol("b"): (np.array([0, 1]), np.array([1, 1])),
+        },
+        start_states={0},
+        final_states={1},
+    )
+
+    assert actual.num_of_states == expected.num_of_states
+    assert actual.start_states == {0}
+    assert dicts_equal(actual.boolean_matrices, expected.boolean_matrices)
+    assert all(m.dtype == bool for m in actual.boolean_matrices.values())
+
+
+def test_semi_naive_closure_equals_squaring_closure():
+    chain = BooleanDecomposition.from_edges(
+        6,
+        {
+            Symbol("a"): ([0, 1, 2, 3], [1, 2, 3, 4]),
+            Symbol("b"): ([4, 5], [5, 2]),
+        },
+    )
+
+    for decomposition in [chain, build_test_boolean_decomposition1()]:
+        expected = decomposition.transitive_closure()
+        actual = decomposition.transitive_closure(semi_naive=True)
+
+        assert np.array_equal(actual.todense(), expected.todense())
+
+
+def test_transform_rows_moves_rows_to_reached_constraint_states():
+    front = sparse.csr_matrix(
+        np.array(
+            [
+                [0, 1, 1, 0, 0],
+                [0, 1, 0, 0, 1],
+                [1, 0, 0, 0, 0],
+                [1, 0, 0, 1, 0],
+            ],
+            dtype=bool,
+        )
+    )
+
+    expected = np.array(
+        [
+            [0, 0, 0, 0, 0],
+            [0, 1, 1, 0, 1],
+            [1, 0, 0, 1, 0],
+            [0, 0, 0, 0, 0],
+        ],
+        dtype=bool,
+    )
+
+    assert np.array_equal(_transform_rows(front, 2).toarray(), expected)
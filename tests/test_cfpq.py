@@ -1,7 +1,7 @@
-from networkx import MultiGraph
+from networkx import MultiDiGraph, MultiGraph
 from pyformlang.cfg import CFG
 
-from project.cfg.cfpq import cfpq
+from project.cfg.cfpq import cfpq, cfpq_multi_source, Algo
 
 cfgs = list(
     map(
@@ -28,3 +28,106 @@ results = [set(), {(0, 2), (0, 0), (1, 1), (2, 2)}]
 def test_cfpq():
     for i in range(1, len(cfgs)):
         assert cfpq(graphs[i], cfgs[i]).__eq__(results[i])
+
+
+def test_hellings_agrees_with_matrix():
+    graph = MultiGraph()
+    graph.add_edges_from(
+        [(i, (i + 1) % 5, {"label": "a"}) for i in range(5)]
+        + [(0, 5, {"label": "b"}), (5, 6, {"label": "b"}), (6, 0, {"label": "b"})]
+    )
+    grammars = [
+        "S -> a S b | a b",
+        "S -> a S b S | $",
+        "S -> A B\nA -> a A | a\nB -> b B | $",
+    ]
+
+    for text in grammars:
+        cfg = CFG.from_text(text)
+
+        assert cfpq(graph, cfg, algo=Algo.hellings) == cfpq(
+            graph, cfg, algo=Algo.matrix_prod
+        )
+
+
+def test_tensor_agrees_with_hellings():
+    graph = MultiGraph()
+    graph.add_edges_from(
+        [(i, (i + 1) % 5, {"label": "a"}) for i in range(5)]
+        + [
+            (0, "x", {"label": "b"}),
+            ("x", "y", {"label": "b"}),
+            ("y", 0, {"label": "b"}),
+        ]
+    )
+    grammars = [
+        "S -> a S b | a b",
+        "S -> a S b S | $",
+        "S -> A B\nA -> a A | a\nB -> b B | $",
+        "S -> a b a b a | S S",
+    ]
+
+    for text in grammars:
+        cfg = CFG.from_text(text)
+
+        assert cfpq(graph, cfg, algo=Algo.tensor) == cfpq(
+            graph, cfg, algo=Algo.hellings
+        )
+
+    # Label equal to variable name is a terminal edge, not derived nonterminal
+    graph = MultiDiGraph()
+    graph.add_edges_from([(0, 1, {"label": "a"}), (1, 2, {"label": "S"})])
+    cfg = CFG.from_text("S -> a S | a")
+
+    assert (
+        cfpq(graph, cfg, algo=Algo.tensor)
+        == cfpq(graph, cfg, algo=Algo.hellings)
+        == {(0, 1)}
+    )
+
+
+def test_multi_source_agrees_with_cfpq():
+    graph = MultiGraph()
+    graph.add_edges_from(
+        [(i, (i + 1) % 5, {"label": "a"}) for i in range(5)]
+        + [
+            (0, "x", {"label": "b"}),
+            ("x", "y", {"label": "b"}),
+            ("y", 0, {"label": "b"}),
+        ]
+        + [("z", "w", {"label": "a"})]
+    )
+    grammars = [
+        "S -> a S b | a b",
+        "S -> a S b S | $",
+        "S -> A B\nA -> a A | a\nB -> b B | $",
+        "S -> S S | a",
+    ]
+
+    for text in grammars:
+        cfg = CFG.from_text(text)
+        for g in [graph, MultiDiGraph(graph)]:
+            for start_nodes in [{0}, {3, "x"}, {"z"}, set(g.nodes), set()]:
+                for final_nodes in [None, set(), {0, "y"}]:
+                    expected = cfpq(g, cfg, start_nodes, final_nodes)
+
+                    assert (
+                        cfpq_multi_source(g, cfg, start_nodes, final_nodes) == expected
+                    )
+
+
+def test_multi_source_orients_edges_between_far_nodes_of_undirected_graph():
+    graph = MultiGraph()
+    graph.add_nodes_from(range(3000))
+    graph.add_edges_from(
+        [(2999, 0, {"label": "a"}), (1, 2999, {"label": "b"})]
+        + [("end", 2999, {"label": "b"})]
+        + [(i + 1, i, {"label": "a"}) for i in range(1500, 1510)]
+    )
+    cfg = CFG.from_text("S -> a S b | a b | a a")
+
+    assert cfpq(graph, cfg, {0}) == {(0, "end")}
+    for start_nodes in [{0}, {1, 1505}, {2999}, {1509}, {"end"}]:
+        assert cfpq_multi_source(graph, cfg, start_nodes) == cfpq(
+            graph, cfg, start_nodes
+        )
@@ -2,6 +2,7 @@ from networkx import MultiGraph
 from pyformlang.cfg import CFG
 
 from project.cfg.cfpq import cfpq, Algo
+from project.instrumentation import Stats
 
 cfgs = list(
     map(
@@ -28,3 +29,29 @@ results = [set(), {(0, 2), (0, 0), (1, 1), (2, 2)}]
 def test_cfpq():
     for i in range(1, len(cfgs)):
         assert cfpq(graphs[i], cfgs[i], algo=Algo.matrix_prod).__eq__(results[i])
+
+
+def test_semi_naive_agrees_with_naive():
+    graph = MultiGraph()
+    graph.add_edges_from(
+        [
+            ("v{i}".format(i=i), "v{i}".format(i=(i + 1) % 6), {"label": "a"})
+            for i in range(6)
+        ]
+        + [("v0", "u", {"label": "b"}), ("u", "v0", {"label": "b"})]
+    )
+
+    for text in ["S -> a S b S | $", "S -> a S b | a b", "S -> S S | a | b"]:
+        cfg = CFG.from_text(text)
+        naive_stats, semi_naive_stats = Stats(), Stats()
+
+        expected = cfpq(graph, cfg, algo=Algo.hellings)
+
+        assert cfpq(graph, cfg, algo=Algo.matrix_prod, stats=naive_stats) == expected
+        assert (
+            cfpq(graph, cfg, algo=Algo.matrix_prod_semi_naive, stats=semi_naive_stats)
+            == expected
+        )
+        nnz = semi_naive_stats.nnz["matrix_prod_semi_naive"]
+        assert nnz == sorted(nnz)
+        assert semi_naive_stats.iterations["matrix_prod_semi_naive"] > 0
@@ -0,0 +1,66 @@
+from networkx import MultiDiGraph
+from pyformlang.cfg import CFG, Terminal, Variable
+
+from project.cache import LRUCache
+from project.cfg.cfpq import cfpq, cfpq_multi_source
+from project.cfg.compiled_grammar import compile_grammar, grammar_cache, grammar_key
+from project.cfg.cyk import cyk
+
+
+def test_compiled_grammar_is_reused_for_same_content():
+    cache = LRUCache(maxsize=4)
+
+    first = compile_grammar(CFG.from_text("S -> a S b | $"), cache)
+    second = compile_grammar(CFG.from_text("S -> $ | a S b"), cache)
+    other_start = compile_grammar(CFG.from_text("S -> a S b | $", Variable("T")), cache)
+
+    assert first is second
+    assert other_start is not first
+    assert cache.info() == (1, 2, 4, 2)
+    assert first.weak_normal_form is first.weak_normal_form
+    assert first.generates_epsilon
+
+
+def test_terminals_and_variables_are_distinguished():
+    assert grammar_key(CFG.from_text("S -> a")) != grammar_key(CFG.from_text("S -> A"))
+
+
+def test_production_tables():
+    grammar = compile_grammar(CFG.from_text("S -> a S b | $"), LRUCache())
+    tables = grammar.weak_tables
+
+    assert Variable("S") in tables.eps
+    assert all(len(body) == 2 for bodies in tables.binary.values() for body in bodies)
+    assert {
+        head for heads in tables.by_body.values() for head in heads
+    } == tables.binary.keys()
+    assert grammar.normal_tables.terminal.keys() == {Terminal("a"), Terminal("b")}
+    assert {
+        (head, other, is_first)
+        for head, bodies in tables.binary.items()
+        for first, second in bodies
+        for symbol, other, is_first in [(first, second, True), (second, first, False)]
+        if symbol == Variable("S")
+    } == set(tables.uses[Variable("S")])
+
+
+def test_cyk_uses_cached_normal_form():
+    cfg = CFG.from_text("S -> a S b | a b")
+    grammar_cache.clear()
+    misses = grammar_cache.misses
+
+    assert cyk(cfg, "aabb") and not cyk(cfg, "abb") and not cyk(cfg, "")
+    assert grammar_cache.misses == misses + 1 and len(grammar_cache) == 1
+
+
+def test_cached_grammar_is_not_changed_by_queries_with_other_start_symbol():
+    graph = MultiDiGraph()
+    graph.add_edge(0, 1, label="a")
+    graph.add_edge(1, 2, label="b")
+    cfg = CFG.from_text("S -> a\nT -> b")
+
+    assert cfpq(graph, cfg, start_symbol=Variable("S")) == {(0, 1)}
+    assert cfpq(graph, cfg, start_symbol=Variable("T")) == {(1, 2)}
+    assert cfpq_multi_source(graph, cfg, {1}, start_symbol=Variable("T")) == {(1, 2)}
+    assert cfg.start_symbol == Variable("S")
+    assert cyk(CFG.from_text("S -> a\nT -> b"), "a")
@@ -0,0 +1,83 @@
+import random
+
+from networkx import MultiDiGraph
+
+from project.re.dynamic_rpq import DynamicRpqIndex
+from project.re.rpq import request_path_query
+
+
+def check_index(index: DynamicRpqIndex, edges: set, regex: str, starts, finals):
+    graph = MultiDiGraph()
+    graph.add_nodes_from(index.node_ids)
+    graph.add_edges_from((u, v, {"label": label}) for u, label, v in edges)
+
+    assert index.pairs() == request_path_query(regex, graph, starts, finals)
+
+
+def test_dynamic_index_follows_updates():
+    regex = "a.(b|c)*"
+    starts, finals = {0, 1, 2}, None
+    edges = {(0, "a", 1), (1, "b", 2)}
+
+    graph = MultiDiGraph()
+    graph.add_edges_from((u, v, {"label": label}) for u, label, v in edges)
+
+    for max_rederive in [0, 100]:
+        index = DynamicRpqIndex(graph, regex, starts, finals, max_rederive)
+        current = set(edges)
+        rng = random.Random(max_rederive)
+
+        for _ in range(40):
+            edge = (rng.randrange(5), rng.choice("abcd"), rng.randrange(5))
+            if edge in current and rng.random() < 0.7:
+                current.remove(edge)
+                index.remove_edge(*edge)
+            else:
+                current.add(edge)
+                index.add_edge(*edge)
+
+            check_index(index, current, regex, starts, finals)
+
+
+def test_reachable_pairs_lookup():
+    graph = MultiDiGraph()
+    graph.add_edge(0, 1, label="a")
+
+    index = DynamicRpqIndex(graph, "a.b")
+
+    assert not index.reachable(0, 2)
+    index.add_edge(1, "b", 2)
+    assert index.reachable(0, 2)
+    index.remove_edge(0, "a", 1)
+    assert not index.reachable(0, 2)
+
+
+def test_product_edge_of_several_labels_is_kept_until_last_label_is_removed():
+    graph = MultiDiGraph()
+    graph.add_edge(0, 1, label="a")
+    graph.add_edge(0, 1, label="b")
+    graph.add_edge(1, 2, label="c")
+
+    index = DynamicRpqIndex(graph, "(a|b).c", max_rederive=0)
+
+    index.remove_edge(0, "a", 1)
+    assert index.reachable(0, 2)
+    index.remove_edge(0, "b", 1)
+    assert not index.reachable(0, 2)
+    index.add_edge(0, "a", 1)
+    assert index.reachable(0, 2)
+
+
+def test_edge_outside_of_regex_alphabet_does_not_grow_index():
+    graph = MultiDiGraph()
+    graph.add_edge(0, 1, label="a")
+
+    index = DynamicRpqIndex(graph, "a.b")
+    size = index._closure.shape
+
+    index.add_edge(1, "c", 2)
+
+    assert index.node_ids == [0, 1]
+    assert index._closure.shape == size
+    index.add_edge(1, "b", 2)
+    assert index.reachable(0, 2)
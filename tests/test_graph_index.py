@@ -0,0 +1,79 @@
+import numpy as np
+from networkx import MultiDiGraph
+from pyformlang.finite_automaton import State
+
+from project.re.graph_index import build_graph_index, load_graph_index
+from project.re.graph_loader import graph_to_boolean_decomposition
+from project.re.regex_cache import compile_regex
+
+
+def build_graph():
+    graph = MultiDiGraph()
+    graph.add_edges_from(
+        [
+            (10, 20, {"label": "a"}),
+            (20, 30, {"label": "b"}),
+            (30, 30, {"label": "b"}),
+            (30, 10, {"label": "c"}),
+        ]
+    )
+    return graph
+
+
+def test_index_round_trip(tmp_path):
+    graph = build_graph()
+    build_graph_index(graph, tmp_path / "index")
+
+    expected = graph_to_boolean_decomposition(graph, {10}, {30})
+
+    for mmap in [True, False]:
+        actual = load_graph_index(tmp_path / "index", {10}, {30}, mmap=mmap)
+
+        assert list(actual.node_ids) == expected.node_ids
+        assert np.array_equal(actual.start_mask, expected.start_mask)
+        assert np.array_equal(actual.final_mask, expected.final_mask)
+        assert actual.boolean_matrices.keys() == expected.boolean_matrices.keys()
+        for symbol, matrix in expected.boolean_matrices.items():
+            assert (actual.boolean_matrices[symbol] != matrix).nnz == 0
+
+
+def test_loaded_index_is_memory_mapped_and_queryable(tmp_path):
+    build_graph_index(build_graph(), tmp_path)
+
+    graph_bd = load_graph_index(tmp_path, {10}, {30})
+
+    assert isinstance(graph_bd.node_ids, np.memmap)
+
+    regex_bd = compile_regex("a.b*").decomposition
+    pairs = graph_bd.product_reachability(regex_bd).nonzero()
+
+    assert [(graph_bd.node_ids[i], graph_bd.node_ids[j]) for i, j in zip(*pairs)] == [
+        (10, 30)
+    ]
+
+
+def test_loading_index_does_not_build_dict_of_nodes(tmp_path):
+    edges = np.array([[10, 20, "a"], [20, 30, "b"], [30, 10, "c"]], dtype=object)
+    build_graph_index(edges, tmp_path)
+
+    graph_bd = load_graph_index(tmp_path)
+
+    assert graph_bd.start_mask.all() and graph_bd.final_mask.all()
+    assert "node_indices" not in graph_bd.__dict__
+
+    graph_bd = load_graph_index(tmp_path, {30, 10, 99, "x", State(20)}, {"10"})
+
+    assert "node_indices" not in graph_bd.__dict__
+    assert graph_bd.start_mask.tolist() == [True, True, True]
+    assert not graph_bd.final_mask.any()
+
+
+def test_string_nodes_are_found_in_sorted_index(tmp_path):
+    edges = np.array([["ab", "b", "a"], ["b", "c", "a"]])
+    build_graph_index(edges, tmp_path)
+
+    graph_bd = load_graph_index(tmp_path, {"b", "abc", 1}, {"c", "a"})
+
+    assert list(graph_bd.node_ids) == ["ab", "b", "c"]
+    assert graph_bd.start_mask.tolist() == [False, True, False]
+    assert graph_bd.final_mask.tolist() == [False, False, True]
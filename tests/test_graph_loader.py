@@ -0,0 +1,144 @@
+import warnings
+
+import numpy as np
+from networkx import MultiDiGraph, MultiGraph
+from pyformlang.finite_automaton import State, Symbol
+
+from project.re.graph import read_graph_from_csv
+from project.re.graph_loader import (
+    csv_to_boolean_decomposition,
+    edge_arrays_to_matrices,
+    edges_to_boolean_decomposition,
+    edges_to_edge_index,
+    graph_to_boolean_decomposition,
+    load_boolean_decomposition,
+    read_edge_arrays,
+)
+
+
+def edges_of(decomposition):
+    ids = decomposition.node_ids
+    return {
+        (ids[i], symbol, ids[j])
+        for symbol, matrix in decomposition.boolean_matrices.items()
+        for i, j in zip(*matrix.nonzero())
+    }
+
+
+def test_directed_graph_decomposition():
+    graph = MultiDiGraph()
+    graph.add_edges_from(
+        [
+            (5, 7, {"label": "a"}),
+            (7, 9, {"label": "b"}),
+            (9, 5, {"label": "a"}),
+            (9, 9, {"weight": 1}),
+        ]
+    )
+
+    decomposition = graph_to_boolean_decomposition(graph, {State(5)}, {9})
+
+    assert decomposition.num_of_states == 3
+    assert edges_of(decomposition) == {(5, "a", 7), (7, "b", 9), (9, "a", 5)}
+    assert decomposition.start_mask.tolist() == [True, False, False]
+    assert decomposition.final_mask.tolist() == [False, False, True]
+    assert decomposition.start_states == {0}
+
+
+def test_undirected_graph_edges_go_both_ways():
+    graph = MultiGraph()
+    graph.add_edges_from([(0, 1, {"label": "a"}), (1, 1, {"label": "b"})])
+
+    decomposition = graph_to_boolean_decomposition(graph)
+
+    assert edges_of(decomposition) == {(0, "a", 1), (1, "a", 0), (1, "b", 1)}
+    assert decomposition.start_mask.all() and decomposition.final_mask.all()
+
+
+def test_edge_array_and_csv_give_same_decomposition(tmp_path):
+    edges = np.array([[3, 1, "a"], [1, 2, "b"], [3, 1, "a"]], dtype=object)
+    filename = tmp_path / "graph.csv"
+    filename.write_text("3 1 a\n1 2 b\n3 1 a\n")
+
+    from_array = edges_to_boolean_decomposition(edges, {3})
+    from_csv = csv_to_boolean_decomposition(str(filename), {3})
+
+    for decomposition in [from_array, from_csv, load_boolean_decomposition(filename)]:
+        assert decomposition.node_ids == [1, 2, 3]
+        assert edges_of(decomposition) == {(3, "a", 1), (1, "b", 2)}
+        assert decomposition.boolean_matrices[Symbol("a")].nnz == 1
+
+    assert from_csv.start_mask.tolist() == [False, False, True]
+
+
+def test_decomposition_is_restricted_to_requested_labels():
+    graph = MultiDiGraph()
+    graph.add_edges_from(
+        [(0, 1, {"label": "a"}), (1, 2, {"label": "b"}), (2, 0, {"label": "c"})]
+    )
+
+    decomposition = graph_to_boolean_decomposition(graph, labels=[Symbol("a"), "c"])
+
+    assert decomposition.num_of_states == 3
+    assert edges_of(decomposition) == {(0, "a", 1), (2, "c", 0)}
+
+
+def test_edge_index_builds_label_matrices_once():
+    edges = np.array([[0, 1, "a"], [1, 2, "b"], [2, 3, "a"]], dtype=object)
+    index = edges_to_edge_index(edges)
+
+    assert index.edge_count("a") == 2 and index.edge_count(Symbol("b")) == 1
+    assert index.edge_count("z") == 0
+
+    first = index.decomposition(labels=["a", "z"])
+    second = index.decomposition({0}, {3})
+
+    assert first.boolean_matrices.keys() == {"a"}
+    assert second.boolean_matrices.keys() == {"a", "b"}
+    assert first.boolean_matrices["a"] is second.boolean_matrices["a"]
+    assert second.start_mask.tolist() == [True, False, False, False]
+
+
+def test_blank_lines_are_skipped_without_warnings(tmp_path):
+    filename = tmp_path / "graph.csv"
+    filename.write_text("\n0 1 a\n \n\n1 2 b\n")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        for chunk_size in [1, 2, 100]:
+            edge_arrays = read_edge_arrays(filename, chunk_size)
+
+            assert edge_arrays.src.tolist() == [0, 1]
+            assert edge_arrays.dst.tolist() == [1, 2]
+
+
+def test_chunked_edge_arrays(tmp_path):
+    filename = tmp_path / "graph.csv"
+    filename.write_text("0 1 a\n1 2 b\n\n2 0 a\n5 5 c\n")
+
+    for chunk_size in [1, 2, 100]:
+        edge_arrays = read_edge_arrays(filename, chunk_size)
+
+        assert edge_arrays.src.tolist() == [0, 1, 2, 5]
+        assert edge_arrays.dst.tolist() == [1, 2, 0, 5]
+        assert [edge_arrays.labels[c] for c in edge_arrays.label_codes] == [
+            "a",
+            "b",
+            "a",
+            "c",
+        ]
+
+    node_ids, matrices = edge_arrays_to_matrices(edge_arrays)
+
+    assert node_ids == [0, 1, 2, 5]
+    assert matrices["a"].nnz == 2 and matrices["c"][3, 3]
+
+    graph = read_graph_from_csv(filename)
+
+    assert graph.number_of_edges() == 4
+    assert sorted(graph.edges(data="label")) == [
+        (0, 1, "a"),
+        (0, 2, "a"),
+        (1, 2, "b"),
+        (5, 5, "c"),
+    ]
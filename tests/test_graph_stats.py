@@ -0,0 +1,37 @@
+import numpy as np
+
+from project.re.graph_index import build_graph_index
+from project.re.graph_stats import DegreeSummary, graph_stats
+
+EDGES = [
+    "10 20 a",
+    "20 30 b",
+    "30 30 b",
+    "30 10 c",
+    "30 40 a",
+]
+
+
+def test_csv_stats(tmp_path):
+    filename = tmp_path / "graph.csv"
+    filename.write_text("\n".join(EDGES) + "\n")
+
+    for chunk_size in [1, 2, 100]:
+        stats = graph_stats(filename, chunk_size)
+
+        assert stats.nodes == 4
+        assert stats.edges == 5
+        assert stats.labels == {"a", "b", "c"}
+        assert stats.label_counts == {"a": 2, "b": 2, "c": 1}
+        assert stats.out_degree == DegreeSummary(0, 3, 1.25)
+        assert stats.in_degree == DegreeSummary(1, 2, 1.25)
+
+
+def test_index_stats_match_csv(tmp_path):
+    filename = tmp_path / "graph.csv"
+    filename.write_text("\n".join(EDGES) + "\n")
+    edges = np.array([edge.split() for edge in EDGES], dtype=object)
+    edges[:, :2] = edges[:, :2].astype(int)
+    build_graph_index(edges, tmp_path / "index")
+
+    assert graph_stats(tmp_path / "index") == graph_stats(filename)
@@ -0,0 +1,67 @@
+from networkx import MultiDiGraph
+from pyformlang.cfg import CFG
+
+from project.cfg.cfpq import cfpq
+from project.cfg.cfpq_algo import Algo
+from project.instrumentation import Stats
+from project.re.regex_cache import regex_cache
+from project.re.rpq import request_path_query, rpq_bfs, rpq_product_free
+
+
+def build_graph():
+    graph = MultiDiGraph()
+    graph.add_edges_from(
+        [
+            (0, 1, {"label": "a"}),
+            (1, 2, {"label": "a"}),
+            (2, 3, {"label": "b"}),
+            (3, 4, {"label": "b"}),
+        ]
+    )
+    return graph
+
+
+def test_rpq_stats():
+    graph = build_graph()
+    regex_cache.clear()
+    events = []
+    stats = Stats(lambda event, name, value: events.append((event, name)))
+
+    actual = request_path_query("a*.b*", graph, stats=stats)
+
+    assert actual == request_path_query("a*.b*", graph)
+    assert {
+        "compile_regex",
+        "regex_to_nfa",
+        "minimize_dfa",
+        "load_graph",
+        "kronecker",
+        "closure",
+        "extraction",
+    } <= stats.timers.keys()
+    assert stats.iterations["closure"] == len(stats.nnz["closure"]) > 0
+    assert stats.nnz["closure"] == sorted(stats.nnz["closure"])
+    assert stats.peak_memory > 0
+    assert ("phase", "closure") in events and ("iteration", "closure") in events
+
+    stats = Stats()
+    rpq_bfs("a*.b*", graph, None, None, True, stats=stats)
+    rpq_product_free("a*.b*", graph, stats=stats)
+
+    assert {"direct_sum", "bfs", "product_reachability"} <= stats.timers.keys()
+    assert stats.iterations["bfs"] > 0 and stats.iterations["product_reachability"] > 0
+    assert "minimize_dfa" not in stats.timers
+
+
+def test_cfpq_stats():
+    graph = build_graph()
+    cfg = CFG.from_text("S -> a S b | a b")
+
+    for algo, loop in [(Algo.hellings, "hellings"), (Algo.matrix_prod, "matrix_prod")]:
+        stats = Stats()
+
+        assert cfpq(graph, cfg, algo=algo, stats=stats) == {(1, 3), (0, 4)}
+        assert {"normal_form", "closure"} <= stats.timers.keys()
+        assert stats.iterations[loop] > 0
+
+    assert stats.report()["nnz"]["matrix_prod"] == stats.nnz["matrix_prod"]
@@ -0,0 +1,75 @@
+import pytest
+from networkx import MultiDiGraph
+
+from project.re.graph_loader import load_edge_index
+from project.re.planner import (
+    Plan,
+    estimate_strategies,
+    execute_plan,
+    plan_query,
+    planned_path_query,
+)
+from project.re.regex_cache import compile_regex
+from project.re.rpq import request_path_query
+
+
+def build_graph():
+    graph = MultiDiGraph()
+    graph.add_edges_from(
+        [(i, (i + 1) % 20, {"label": "a" if i % 3 else "b"}) for i in range(20)]
+        + [(i, (i * 7) % 20, {"label": "c"}) for i in range(0, 20, 4)]
+    )
+    return graph
+
+
+def test_strategies_agree():
+    graph = build_graph()
+
+    for regex in ["a*.b", "(a|b|c)*", "c.a.a"]:
+        for start_nodes in [None, {0, 5, 13}]:
+            expected = request_path_query(regex, graph, start_nodes, {1, 4, 8, 12})
+            regex_bd = compile_regex(regex).decomposition
+            edge_index = load_edge_index(graph)
+
+            for plan in [
+                Plan("closure", None, 0, 0),
+                Plan("bfs", None, 0, 0),
+                Plan("product_free", None, 0, 0),
+                Plan("bfs_batched", 2, 0, 0),
+            ]:
+                graph_bd = edge_index.decomposition(
+                    start_nodes, {1, 4, 8, 12}, regex_bd.boolean_matrices.keys()
+                )
+                assert execute_plan(plan, graph_bd, regex_bd) == expected
+
+            assert (
+                planned_path_query(regex, graph, start_nodes, {1, 4, 8, 12}) == expected
+            )
+
+
+def test_plan_choice():
+    edge_index = load_edge_index(build_graph())
+    regex_bd = compile_regex("(a|b|c)*").decomposition
+
+    assert plan_query(edge_index, regex_bd, 20).strategy == "closure"
+    assert plan_query(edge_index, regex_bd, 1).strategy != "closure"
+
+
+def test_memory_budget():
+    graph = build_graph()
+    edge_index = load_edge_index(graph)
+    regex_bd = compile_regex("(a|b|c)*").decomposition
+    estimates = estimate_strategies(edge_index, regex_bd, 20)
+    budget = min(estimate.memory for estimate in estimates.values()) - 1
+
+    plan = plan_query(edge_index, regex_bd, 20, budget)
+
+    assert plan.strategy == "bfs_batched"
+    assert 1 <= plan.batch_size < 20
+    assert plan.estimated_memory <= budget
+    assert planned_path_query("(a|b|c)*", graph, memory_budget=budget) == (
+        request_path_query("(a|b|c)*", graph)
+    )
+
+    with pytest.raises(ValueError):
+        plan_query(edge_index, regex_bd, 20, 10)
@@ -0,0 +1,32 @@
+from pyformlang.finite_automaton import Symbol
+
+from project.cache import LRUCache
+from project.re.regex_cache import compile_regex
+
+
+def test_compiled_regex_is_reused_for_normalized_text():
+    cache = LRUCache(maxsize=4)
+
+    first = compile_regex("a.b*", cache)
+    second = compile_regex("  a.b*\n", cache)
+
+    assert first is second
+    assert first.dfa.accepts([Symbol("a"), Symbol("b")])
+    assert first.decomposition.num_of_states == len(first.dfa.states)
+    assert cache.info() == (1, 1, 4, 1)
+
+
+def test_least_recently_used_regex_is_evicted():
+    cache = LRUCache(maxsize=2)
+
+    compile_regex("a", cache)
+    compile_regex("b", cache)
+    compile_regex("a", cache)
+    compile_regex("c", cache)
+
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    cache.resize(1)
+
+    assert len(cache) == 1 and "c" in cache
@@ -1,7 +1,15 @@
-from networkx import MultiGraph
+from networkx import MultiDiGraph, MultiGraph
 from pyformlang.finite_automaton import State
 
-from project.re.rpq import request_path_query, rpq_bfs
+from project.re.parallel import Parallelism
+from project.re.rpq import (
+    request_path_query,
+    rpq_bfs,
+    rpq_bfs_batched,
+    rpq_path_exists,
+    rpq_product_free,
+    rpq_reachable,
+)
 
 
 def generate_graph():
@@ -56,10 +64,171 @@ def test_rpq_bfs_common():
     assert result == {2}
 
 
-# def test_rpq_bfs_separated():
-#     graph = graph1()
-#     regex = "a.b*"
-#
-#     result = rpq_bfs(regex, graph, {0, 1}, {2}, True)
-#
-#     assert result == {(0, 2), (1, 2)}
+def test_rpq_bfs_separated():
+    graph = graph1()
+    regex = "a.b*"
+
+    result = rpq_bfs(regex, graph, {0, 1}, {2}, True)
+
+    assert result == {(0, 2), (1, 2)}
+
+
+def test_rpq_bfs_starts_from_regex_start_state():
+    graph = MultiDiGraph()
+    graph.add_edges_from([(0, 1, {"label": "b"}), (1, 2, {"label": "a"})])
+
+    assert rpq_bfs("a.b", graph, {0}, {1, 2}, False) == set()
+    assert rpq_bfs("b.a", graph, {0}, {1, 2}, False) == {2}
+    assert rpq_bfs("b*", graph, {0, 1}, {0, 1, 2}, True) == {(0, 1)}
+
+
+def test_rpq_bfs_agrees_with_request_path_query():
+    graph = generate_graph()
+
+    for regex in ["a.b.b*", "(a|b)*", "b.a*"]:
+        pairs = request_path_query(regex, graph)
+
+        assert rpq_bfs(regex, graph, None, None, True) == pairs
+        assert rpq_bfs(regex, graph, {0}, None, False) == {
+            end for start, end in pairs if start == 0
+        }
+
+
+def test_rpq_bfs_batched_agrees_with_separated():
+    graph = generate_graph()
+    regex = "(a|b).b*"
+
+    expected = rpq_bfs(regex, graph, None, None, True)
+
+    for batch_size in [1, 2, 10]:
+        result = list(rpq_bfs_batched(regex, graph, None, None, batch_size))
+
+        assert len(result) == len(expected)
+        assert set(result) == expected
+
+
+def test_rpq_product_free_agrees_with_request_path_query():
+    graph = generate_graph()
+
+    for regex in ["a.b.b*", "(a|b)*", "b.a*", "a.a.a", ""]:
+        for starts, finals in [(None, None), ({0, 1}, {2})]:
+            assert rpq_product_free(regex, graph, starts, finals) == (
+                request_path_query(regex, graph, starts, finals)
+            )
+
+
+def test_parallel_evaluation_gives_same_results():
+    graph = generate_graph()
+    regex = "(a|b).b*"
+
+    for kind in ["thread", "process"]:
+        parallelism = Parallelism(kind, max_workers=2)
+        try:
+            assert request_path_query(
+                regex, graph, parallelism=parallelism
+            ) == request_path_query(regex, graph)
+            assert rpq_bfs(
+                regex, graph, {0, 1}, None, True, parallelism=parallelism
+            ) == rpq_bfs(regex, graph, {0, 1}, None, True)
+        finally:
+            parallelism.shutdown()
+
+
+class RecordingParallelism(Parallelism):
+    def __init__(self):
+        super().__init__("thread", max_workers=2)
+        self.functions = []
+
+    def map(self, func, args_list) -> list:
+        self.functions.append(func.__name__)
+        return super().map(func, args_list)
+
+
+def test_rpq_bfs_direct_sum_uses_given_parallelism():
+    parallelism = RecordingParallelism()
+    try:
+        rpq_bfs("(a|b).b*", generate_graph(), {0, 1}, None, True, parallelism)
+    finally:
+        parallelism.shutdown()
+
+    assert "_block_diag" in parallelism.functions
+
+
+class SharingParallelism(Parallelism):
+    def __init__(self):
+        super().__init__("process", max_workers=2)
+        self.shared = 0
+        self.maps = 0
+
+    def share(self, matrices) -> list:
+        self.shared += 1
+        return super().share(matrices)
+
+    def map(self, func, args_list) -> list:
+        self.maps += 1
+        return super().map(func, args_list)
+
+
+def test_process_workers_get_graph_matrices_once_per_traversal():
+    parallelism = SharingParallelism()
+    try:
+        assert rpq_bfs(
+            "(a|b).b*", generate_graph(), {0, 1}, None, True, parallelism
+        ) == rpq_bfs("(a|b).b*", generate_graph(), {0, 1}, None, True)
+    finally:
+        parallelism.shutdown()
+
+    assert parallelism.shared == 1
+    assert parallelism.maps > 2
+    assert not parallelism._shared
+
+
+def test_request_path_query_output_formats():
+    graph = generate_graph()
+    regex = "(a|b).b*"
+
+    pairs = request_path_query(regex, graph)
+    array = request_path_query(regex, graph, output="array")
+    matrix = request_path_query(regex, graph, output="matrix")
+    node_ids = list(graph.nodes)
+
+    assert array.shape == (len(pairs), 2)
+    assert {tuple(pair) for pair in array.tolist()} == pairs
+    assert matrix.shape == (4, 4)
+    assert {(node_ids[i], node_ids[j]) for i, j in zip(*matrix.nonzero())} == pairs
+    assert {
+        tuple(pair) for pair in rpq_product_free(regex, graph, output="array").tolist()
+    } == pairs
+
+
+def test_array_output_keeps_types_of_mixed_nodes():
+    graph = MultiDiGraph()
+    graph.add_edge(0, "x", label="a")
+    graph.add_edge("x", 1, label="a")
+
+    for output in [
+        request_path_query("a", graph, output="array"),
+        rpq_product_free("a", graph, output="array"),
+    ]:
+        assert output.dtype == object
+        assert {tuple(pair) for pair in output.tolist()} == {(0, "x"), ("x", 1)}
+
+
+def test_single_source_and_point_to_point_queries():
+    graph = generate_graph()
+
+    for regex in ["a.b.b*", "(a|b)*", "b.a*", "c"]:
+        pairs = request_path_query(regex, graph)
+
+        for source in graph.nodes:
+            expected = {end for start, end in pairs if start == source}
+
+            assert rpq_reachable(regex, graph, source) == expected
+            assert rpq_reachable(regex, graph, State(source), {2}) == expected & {2}
+            for target in graph.nodes:
+                assert rpq_path_exists(regex, graph, source, target) == (
+                    target in expected
+                )
+
+    assert not rpq_path_exists("a", graph, 0, 42)
+    assert rpq_reachable("a", graph, 42) == set()
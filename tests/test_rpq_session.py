@@ -0,0 +1,60 @@
+import cfpq_data
+
+from project.instrumentation import Stats
+from project.re.rpq import rpq_bfs
+from project.re.rpq_session import Query, RpqSession
+from tests.test_rpq import generate_graph, graph1
+
+
+def test_session_results_agree_with_rpq_bfs():
+    graph = generate_graph()
+    queries = [
+        Query("a.b.b*", {0}, {2}, False),
+        Query("a.b.b*", None, None, True),
+        ("(a|b)*", {0, 3}, {1, 2}, True),
+        (" (a|b)* ", {1}, None, False),
+        ("b.a*", None, {2}, False),
+    ]
+
+    session = RpqSession(graph)
+    results = session.run(queries)
+
+    for (regex, starts, finals, separated), result in zip(queries, results):
+        assert result == rpq_bfs(regex, graph, starts, finals, separated)
+
+
+def test_session_reuses_reachable_nodes_between_batches():
+    session = RpqSession(graph1(), batch_size=1)
+
+    assert session.query("a.b*", {0}, {2}) == {2}
+    assert session.query("a.b*", {0, 1}, {2}, separated=True) == {(0, 2), (1, 2)}
+    assert ("a.b*", 0) in session.reachable_cache
+    assert ("a.b*", 1) in session.reachable_cache
+
+
+def test_session_bounds_remembered_start_nodes():
+    graph = generate_graph()
+    session = RpqSession(graph, cache_size=2)
+
+    assert session.query("(a|b)*", None, None, True) == rpq_bfs(
+        "(a|b)*", graph, None, None, True
+    )
+    assert len(session.reachable_cache) == 2
+    assert session.query("(a|b)*", {0}, None, True) == rpq_bfs(
+        "(a|b)*", graph, {0}, None, True
+    )
+
+
+def test_not_separated_queries_are_answered_by_one_traversal():
+    graph = cfpq_data.labeled_two_cycles_graph(50, 50, labels=("a", "b"))
+    session_stats, plain_stats = Stats(), Stats()
+    session = RpqSession(graph, batch_size=8, stats=session_stats)
+
+    results = session.run([("a*.b", None, None, False), ("a*.b", None, {0}, False)])
+
+    assert results == [
+        rpq_bfs("a*.b", graph, None, None, False, stats=plain_stats),
+        rpq_bfs("a*.b", graph, None, {0}, False),
+    ]
+    assert session_stats.iterations["bfs"] == plain_stats.iterations["bfs"]
+    assert len(session.reachable_cache) == 0